@@ -40,10 +40,12 @@ class AM2315(object):
         # 1. WRITE command to register 0x03 with start register and count
         # 2. READ command (any register)
         # Response frame: 0x03, len, data, 2xCRC => n+4 bytes
-        self._bus.write_i2c_block_data(
-            self.I2C_ADDRESS, self.READ_REGISTER_DATA, [register, count])
-        rawdata = self._bus.read_i2c_block_data(self.addr, 0x00, count + 4)
-        return rawdata[2:-2]
+        with self._bus.exclusive():
+            self._bus.write_i2c_block_data(
+                self.I2C_ADDRESS, self.READ_REGISTER_DATA, [register, count])
+            rawdata = self._bus.read_i2c_block_data(
+                self.addr, 0x00, count + 4)
+        return bytes(rawdata[2:-2])
 
     def humidity(self):
         """Return measured humidity in %."""
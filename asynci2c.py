@@ -0,0 +1,219 @@
+"""
+This module defines asyncio front-ends for I2CBus and sensor drivers.
+
+Blocking I2C calls are run in a single worker thread per physical bus
+(per interface object for drivers on SPI), so coroutines never block
+the event loop, transactions on one bus are executed in order
+of submission, and devices on different buses are polled concurrently.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Lock
+
+from i2c import I2CBus
+from bmp280 import BMP280
+from bme280 import BME280
+from ina219 import INA219
+from tsl2561 import TSL2561
+
+
+# Worker threads, keyed by bus number (or id of interface without one):
+# [executor, reference count]
+_workers = {}
+_workers_lock = Lock()
+
+
+def _acquire_worker(bus) -> ThreadPoolExecutor:
+    """Get (and start if needed) the worker thread of the bus."""
+    with _workers_lock:
+        worker = _workers.get(bus)
+        if worker is None:
+            executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='i2c-{}'.format(bus)
+                if isinstance(bus, int) else 'bus-{:x}'.format(bus[1]))
+            worker = _workers[bus] = [executor, 0]
+        worker[1] += 1
+        return worker[0]
+
+
+def _release_worker(bus) -> None:
+    """Drop a reference to the worker, stopping it after the last one."""
+    with _workers_lock:
+        worker = _workers[bus]
+        worker[1] -= 1
+        if worker[1] > 0:
+            return
+        del _workers[bus]
+    worker[0].shutdown(wait=False)
+
+
+def _async_method(name):
+    """Create coroutine method running method of the wrapped object."""
+    async def method(self, *args, **kwargs):
+        return await self._run(getattr(self._target, name), *args, **kwargs)
+    method.__name__ = name
+    return method
+
+
+def _async_property(name):
+    """Create coroutine method reading property of the wrapped object."""
+    async def method(self):
+        return await self._run(getattr, self._target, name)
+    method.__name__ = name
+    return method
+
+
+class _AsyncWrapper(object):
+
+    """Common part of asyncio front-ends (for internal use)."""
+
+    # Names of wrapped methods and properties (coroutines in subclasses)
+    _methods = ()
+    _properties = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        wrapped = getattr(cls, '_wrapped', None)
+        for name in cls._methods:
+            method = _async_method(name)
+            method.__doc__ = getattr(wrapped, name).__doc__
+            setattr(cls, name, method)
+        for name in cls._properties:
+            method = _async_property(name)
+            method.__doc__ = getattr(wrapped, name).__doc__
+            setattr(cls, name, method)
+
+    def _attach(self, target, bus) -> None:
+        self._target = target
+        # Interfaces without bus number (like SPI) get a worker of their own
+        self._busnum = getattr(bus, 'busnum', None)
+        if self._busnum is None:
+            self._busnum = ('id', id(bus))
+        self._executor = _acquire_worker(self._busnum)
+
+    async def _run(self, func, *args, **kwargs):
+        """Run blocking function in the bus worker thread."""
+        if self._executor is None:
+            raise RuntimeError('Object is closed')
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, partial(func, *args, **kwargs))
+
+    def close(self) -> None:
+        """Release the bus worker thread."""
+        if getattr(self, '_executor', None) is not None:
+            self._executor = None
+            _release_worker(self._busnum)
+
+    def __del__(self):
+        self.close()
+
+
+class AsyncI2CBus(_AsyncWrapper):
+
+    """
+    asyncio version of I2CBus.
+
+    Takes the same arguments as I2CBus. All transaction methods are
+    coroutines with the same arguments as their I2CBus counterparts.
+    The wrapped I2CBus is available as the bus attribute, e.g. for
+    passing to synchronous code running in run().
+    """
+
+    _wrapped = I2CBus
+    _methods = ('write_quick', 'read_byte', 'write_byte',
+                'read_byte_data', 'write_byte_data',
+                'read_word_data', 'write_word_data',
+                'read_word_swapped', 'write_word_swapped',
+                'process_call', 'read_block_data', 'write_block_data',
+                'block_process_call', 'read_i2c_block_data',
+                'read_i2c_block_into', 'read_i2c_block_bytes',
+                'write_i2c_block_data', 'transfer')
+
+    def __init__(self, bus: int=None, **kwargs) -> None:
+        self.bus = I2CBus(bus, **kwargs)
+        self._attach(self.bus, self.bus)
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run any blocking function in the bus worker thread.
+
+        Useful for multi-transaction sequences,
+        which are then executed without interruption.
+        """
+        return await self._run(func, *args, **kwargs)
+
+    def close(self) -> None:
+        """Disconnect the object from the bus."""
+        super().close()
+        if getattr(self, 'bus', None) is not None:
+            self.bus.close()
+
+
+class AsyncBMP280(_AsyncWrapper):
+
+    """
+    asyncio version of BMP280 driver.
+
+    Takes the same arguments as BMP280 (the chip is calibrated
+    synchronously on creation). Methods and properties
+    are coroutines, the wrapped driver is available as device.
+    """
+
+    _wrapped = BMP280
+    _methods = ('calibrate', 'reset', 'set_acquisition_options',
+                'set_config', 'raw_pressure', 'raw_temperature',
+                'raw_measurement', 'temperature', 'pressure', 'measure')
+    _properties = ('id', 'status', 'ctrl_meas', 'config')
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.device = self._wrapped(*args, **kwargs)
+        self._attach(self.device, self.device._bus)
+
+
+class AsyncBME280(AsyncBMP280):
+
+    """asyncio version of BME280 driver (see AsyncBMP280)."""
+
+    _wrapped = BME280
+    _methods = AsyncBMP280._methods + ('raw_humidity', 'humidity')
+    _properties = AsyncBMP280._properties + ('ctrl_hum',)
+
+
+class AsyncINA219(_AsyncWrapper):
+
+    """
+    asyncio version of INA219 driver.
+
+    Takes the same arguments as INA219. Methods are coroutines,
+    the wrapped driver is available as device.
+    """
+
+    _wrapped = INA219
+    _methods = ('mode', 'shuntADC', 'busADC', 'gain', 'vrange', 'reset',
+                'shunt_voltage', 'bus_voltage', 'power', 'current',
+                'set_calibration')
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.device = self._wrapped(*args, **kwargs)
+        self._attach(self.device, self.device._bus)
+
+
+class AsyncTSL2561(_AsyncWrapper):
+
+    """
+    asyncio version of TSL2561 driver.
+
+    Takes the same arguments as TSL2561. Methods are coroutines,
+    the wrapped driver is available as device.
+    """
+
+    _wrapped = TSL2561
+    _methods = ('power', 'timing', 'id', 'data',
+                'fullspectrum', 'infrared', 'visible')
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.device = self._wrapped(*args, **kwargs)
+        self._attach(self.device, self.device._bus)
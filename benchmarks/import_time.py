@@ -0,0 +1,67 @@
+"""
+Benchmark of startup cost of the i2c module and drivers.
+
+Each measurement runs in a fresh interpreter. Exits with status 1
+if importing i2c loads an SMBus backend (it must be deferred until
+first use) or if any import takes longer than the limit.
+
+    python3 benchmarks/import_time.py [limit in ms]
+"""
+
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ['i2c', 'bme280', 'ina219', 'pcf8574']
+BACKENDS = ['smbus', 'smbus2', 'Adafruit_PureIO', 'i2cdev']
+RUNS = 10
+
+_SCRIPT = """
+import sys
+from time import perf_counter
+start = perf_counter()
+import {module}
+elapsed = perf_counter() - start
+loaded = [name for name in {backends!r} if name in sys.modules]
+print(elapsed, ','.join(loaded))
+"""
+
+
+def measure(module: str) -> (float, list):
+    """Return best import time of module (seconds) and loaded backends."""
+    best = None
+    loaded = []
+    for _ in range(RUNS):
+        output = subprocess.check_output(
+            [sys.executable, '-c',
+             _SCRIPT.format(module=module, backends=BACKENDS)],
+            cwd=ROOT, universal_newlines=True)
+        elapsed, names = output.split()[0], output.split()[1:]
+        elapsed = float(elapsed)
+        if best is None or elapsed < best:
+            best = elapsed
+        loaded = names[0].split(',') if names else []
+    return best, loaded
+
+
+def main() -> int:
+    limit = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.05
+    status = 0
+    for module in MODULES:
+        elapsed, loaded = measure(module)
+        print('{:10} {:8.2f} ms  {}'.format(
+            module, elapsed * 1000,
+            'backend loaded: ' + ', '.join(loaded) if loaded else ''))
+        if module == 'i2c' and loaded:
+            status = 1
+        if elapsed > limit:
+            print('{}: import slower than {:.0f} ms'.format(
+                module, limit * 1000))
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
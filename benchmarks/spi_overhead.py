@@ -0,0 +1,65 @@
+"""
+Benchmark of per-transfer Python overhead of the spi module.
+
+Transfers are performed on a simulated loopback device (spisim) with
+latency disabled, so the measured time is the cost of the Python code
+of SPI and the device class. The first column is the bare simulated
+device call, for reference.
+
+    python3 benchmarks/spi_overhead.py [payload sizes...]
+"""
+
+import os
+import sys
+from timeit import Timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spi import SPI  # noqa: E402
+from spisim import SimulatedSpiDev  # noqa: E402
+
+
+SIZES = [1, 4, 32, 256, 4096]
+
+
+def per_call(func, minimum: float=0.2) -> float:
+    """Return best time of single func() call in seconds."""
+    timer = Timer(func)
+    number, _ = timer.autorange()
+    number = max(number, int(number * minimum / 0.2))
+    return min(timer.repeat(repeat=5, number=number)) / number
+
+
+def benchmarks(spi: SPI, size: int) -> list:
+    """Return [(name, function)] of operations with payload of size."""
+    values = [0x55] * size
+    data = bytes(values)
+    buffer = bytearray(size)
+    return [
+        ('device xfer2', lambda: spi.dev.xfer2(values)),
+        ('xfer', lambda: spi.xfer(values)),
+        ('xfer2', lambda: spi.xfer2(values)),
+        ('readbytes', lambda: spi.readbytes(size)),
+        ('writebytes', lambda: spi.writebytes(values)),
+        ('transfer', lambda: spi.transfer(data, buffer)),
+        ('read_into', lambda: spi.read_into(buffer)),
+        ('write', lambda: spi.write(data)),
+    ]
+
+
+def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    spi = SPI(0, 0, spidev=SimulatedSpiDev)
+    names = [name for name, _ in benchmarks(spi, 1)]
+    print('Time per call in microseconds (simulated loopback device)')
+    print('{:>6}'.format('bytes') +
+          ''.join('{:>14}'.format(name) for name in names))
+    for size in sizes:
+        times = [per_call(func) for _, func in benchmarks(spi, size)]
+        print('{:>6}'.format(size) +
+              ''.join('{:>14.2f}'.format(t * 1e6) for t in times))
+    spi.close()
+
+
+if __name__ == '__main__':
+    main()
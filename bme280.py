@@ -1,6 +1,7 @@
-from ctypes import c_short, c_byte, c_ubyte
+from ctypes import c_short
+from struct import unpack_from
 
-from bmp280 import BMP280, BMP280Error
+from bmp280 import BMP280, BMP280Error, _numpy
 
 
 BME280Error = BMP280Error
@@ -17,42 +18,55 @@ class BME280(BMP280):
 
     HUM = 0xfd  # - 0xfe (msb, lsb)
 
-    def __init__(self, bus=None, alternativeAddress=False):
-        """Create object representing BME280 chip."""
-        super().__init__(bus, alternativeAddress)
+    # Length of all measurement registers, starting with PRESS
+    MEASUREMENT_LENGTH = 8
+
+    def __init__(self, bus=None, alternativeAddress=False, interface=None,
+                 integer=False):
+        """
+        Create object representing BME280 chip (see BMP280 for integer).
+        """
+        self._raw_hum = bytearray(2)  # buffer for raw humidity
+        super().__init__(bus, alternativeAddress, interface, integer)
+        self._regs.cache_registers(self.CTRL_HUM)
 
     def calibrate(self):
         """Calibrate using data stored in device."""
-        super().calibrate()
-        dataH1 = self._bus.read_i2c_block_data(self.addr,
-                                               self.CALIBRATION_H1, 1)
-        dataHX = self._bus.read_i2c_block_data(self.addr,
-                                               self.CALIBRATION_HX, 7)
-
-        self.dig_H1 = float(c_ubyte(dataH1[0]).value)
-        self.dig_H2 = float(c_short((dataHX[1] << 8) + dataHX[0]).value)
-        self.dig_H3 = float(c_ubyte(dataHX[2]).value)
+        with self._regs.exclusive():
+            super().calibrate()
+            dataH1 = self._regs.read(self.CALIBRATION_H1, 1)
+            dataHX = self._regs.read(self.CALIBRATION_HX, 7)
+
+        self.dig_H1 = float(dataH1[0])
+        self.dig_H2, self.dig_H3 = (float(i) for i in
+                                    unpack_from('<hB', dataHX))
         self.dig_H4 = float(c_short(
             (dataHX[3] << 4) + (dataHX[4] & 0xf)).value)
         self.dig_H5 = float(c_short(
             (dataHX[5] << 4) + ((dataHX[4] & 0xf0) >> 4)).value)
-        self.dig_H6 = float(c_byte(dataHX[6]).value)
+        self.dig_H6 = float(unpack_from('b', dataHX, 6)[0])
+        # Constant terms of the compensation formula
+        self._coef_H = (self.dig_H1 / 524288.0, self.dig_H2 / 65536.0,
+                        self.dig_H3 / 67108864.0, self.dig_H4 * 64.0,
+                        self.dig_H5 / 16384.0, self.dig_H6 / 67108864.0)
+        self._int_H = (int(self.dig_H1), int(self.dig_H2), int(self.dig_H3),
+                       int(self.dig_H4) << 20, int(self.dig_H5),
+                       int(self.dig_H6))
 
     @property
     def id(self):
         """Return chip ID - should be 96 (0x60)."""
-        return super().id()
+        return super().id
 
     @property
     def ctrl_hum(self):
         """Return (raw) value of ctrl_hum register."""
-        return self._bus.read_byte_data(self.addr, self.CTRL_HUM)
+        return self._regs.read_byte(self.CTRL_HUM)
 
     def _ctrl_hum_set(self, osrs_h):
         """Set ctrl_hum register (for internal use)."""
         data = osrs_h & 0x7
-        self._bus.write_byte_data(self.addr, self.CTRL_HUM,
-                                  data)
+        self._regs.write_byte(self.CTRL_HUM, data)
 
     def set_acquisition_options(self, temperature_oversampling,
                                 pressure_oversampling, mode,
@@ -110,7 +124,8 @@ class BME280(BMP280):
 
     def raw_humidity(self):
         """Return measured humidity (raw data)."""
-        data = self._bus.read_i2c_block_data(self.addr, self.HUM, 2)
+        data = self._raw_hum
+        self._regs.read_into(self.HUM, data)
         return (data[0] << 8) + data[1]
 
     def humidity(self, update_temperature=True):
@@ -118,19 +133,99 @@ class BME280(BMP280):
         if (self.t_fine is None) or update_temperature:
             self.temperature()
 
-        adc_H = float(self.raw_humidity())
-        var_H = self.t_fine - 76800.0
-        var_H = (
-            (adc_H - (self.dig_H4 * 64.0 + self.dig_H5 / 16384.0 * var_H)) *
-            (self.dig_H2 / 65536.0 * (
-                1.0 + self.dig_H6 / 67108864.0 * var_H *
-                (1.0 + self.dig_H3 / 67108864.0 * var_H)))
-        )
-        var_H = var_H * (1.0 - self.dig_H1 * var_H / 524288.0)
-
+        return self._compensate_humidity(self.raw_humidity(), self.t_fine)
+
+    def raw_measurement(self):
+        """
+        Return all measurements (raw data) as tuple
+        (pressure, temperature, humidity), read in a single transaction
+        (consistent with each other).
+        """
+        data = self._burst
+        self._regs.read_into(self.PRESS, data)
+        return ((data[0] << 12) + (data[1] << 4) + (data[2] >> 4),
+                (data[3] << 12) + (data[4] << 4) + (data[5] >> 4),
+                (data[6] << 8) + data[7])
+
+    def _humidity(self, adc_H, t_fine):
+        """
+        Return humidity in % for raw humidity, not limited to 0-100 %
+        (for internal use). Works with NumPy arrays as well.
+        """
+        H1, H2, H3, H4, H5, H6 = self._coef_H
+        var_H = t_fine - 76800.0
+        var_H = ((adc_H - (H4 + H5 * var_H)) *
+                 (H2 * (1.0 + H6 * var_H * (1.0 + H3 * var_H))))
+        return var_H * (1.0 - H1 * var_H)
+
+    def _humidity_int(self, adc_H, t_fine):
+        """
+        Return humidity in 1/1024 % for raw humidity, using 32-bit
+        integer formulas (for internal use).
+        """
+        H1, H2, H3, H4x, H5, H6 = self._int_H
+        v = t_fine - 76800
+        v = ((((adc_H << 14) - H4x - (H5 * v) + 16384) >> 15) *
+             (((((((v * H6) >> 10) * (((v * H3) >> 11) + 32768)) >> 10) +
+                2097152) * H2 + 8192) >> 14))
+        v = v - (((((v >> 15) * (v >> 15)) >> 7) * H1) >> 4)
+        if (v > 419430400):
+            v = 419430400
+        elif (v < 0):
+            v = 0
+        return v >> 12
+
+    def _compensate_humidity(self, adc_H, t_fine):
+        """
+        Return humidity in % for raw humidity, using selected formulas
+        (for internal use).
+        """
+        if self._integer:
+            return self._humidity_int(adc_H, t_fine) / 1024
+        var_H = self._humidity(adc_H, t_fine)
         if (var_H > 100.0):
             var_H = 100.0
         elif (var_H < 0.0):
             var_H = 0.0
 
         return round(var_H, 3)
+
+    def measure(self):
+        """
+        Return measured temperature in Celsius, pressure in Pascals
+        and humidity in % as tuple (temperature, pressure, humidity),
+        from a single burst read of all measurement registers
+        (as recommended by datasheet).
+        """
+        adc_P, adc_T, adc_H = self.raw_measurement()
+        T, self.t_fine = self._compensate_temperature(adc_T)
+        return (T, self._compensate_pressure(adc_P, self.t_fine),
+                self._compensate_humidity(adc_H, self.t_fine))
+
+    @classmethod
+    def decode_measurements(cls, data):
+        """
+        Return raw measurements stored in data (results of raw burst
+        reads of all measurement registers, one after another) as tuple
+        of NumPy arrays (pressure, temperature, humidity).
+        """
+        adc_P, adc_T = super().decode_measurements(data)
+        numpy = _numpy()
+        data = numpy.frombuffer(data, numpy.uint8).reshape(
+            -1, cls.MEASUREMENT_LENGTH).astype(numpy.int64)
+        return adc_P, adc_T, (data[:, 6] << 8) + data[:, 7]
+
+    def compensate(self, adc_P, adc_T, adc_H):
+        """
+        Return temperatures in Celsius, pressures in Pascals and
+        humidities in % for sequences of raw measurements (e.g. logged
+        values of raw_measurement() or results of decode_measurements()),
+        as tuple of NumPy arrays (temperature, pressure, humidity).
+
+        The whole batch is compensated with vectorized NumPy operations,
+        values are not rounded.
+        """
+        T, P, t_fine = self._compensate_arrays(adc_P, adc_T)
+        numpy = _numpy()
+        H = self._humidity(numpy.asarray(adc_H, numpy.float64), t_fine)
+        return T, P, numpy.clip(H, 0.0, 100.0)
@@ -1,13 +1,35 @@
-from ctypes import c_short, c_ushort
+from struct import unpack
+
 from i2c import I2CBus, I2CError
+from registers import I2CRegisters
 
 
 class BMP280Error(I2CError):
     pass
 
 
+def _numpy():
+    """Return NumPy module, imported on first use (batch processing)."""
+    try:
+        import numpy
+    except ImportError as err:
+        raise ImportError('NumPy is required for batch processing') from err
+    return numpy
+
+
+def _div(a, b):
+    """Integer division truncating toward zero (as in C)."""
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+
 class BMP280(object):
-    """Library for BMP280 pressure & temperature sensor."""
+    """
+    Library for BMP280 pressure & temperature sensor.
+
+    Connected through I2C by default; pass interface (see registers
+    module) to use another transport, e.g. SPIRegisters for SPI.
+    """
 
     I2C_ADDRESS = 0x77
     I2C_ADDRESS2 = 0x76
@@ -22,6 +44,9 @@ class BMP280(object):
     PRESS = 0xf7  # - 0xf9 (msb, lsb, xlsb)
     TEMP = 0xfa  # - 0xfc (msb, lsb, xlsb)
 
+    # Length of all measurement registers, starting with PRESS
+    MEASUREMENT_LENGTH = 6
+
     # Constants
     SLEEP_MODE = 0x00
     FORCED_MODE = 0x01
@@ -51,46 +76,82 @@ class BMP280(object):
     FILTER_8 = 0x03
     FILTER_16 = 0x04
 
-    def __init__(self, bus=None, alternativeAddress=False):
-        """Create object representing BMP280 chip."""
-        self._bus = I2CBus(bus)
+    def __init__(self, bus=None, alternativeAddress=False, interface=None,
+                 integer=False):
+        """
+        Create object representing BMP280 chip.
+
+        With integer=True, measurements are compensated with the integer
+        formulas of the datasheet (see the integer property).
+        """
         self.addr = self.I2C_ADDRESS
         if alternativeAddress:
             self.addr = self.I2C_ADDRESS2
+        if interface is None:
+            interface = I2CRegisters(I2CBus(bus), self.addr)
+        self._regs = interface
+        self._bus = interface.bus
+        # CONFIG is not cached: writes to it in normal mode may be
+        # ignored by the chip, so they must not be skipped
+        self._raw = bytearray(3)  # buffer for raw measurements
+        self._burst = bytearray(self.MEASUREMENT_LENGTH)
         self.t_fine = None
+        self._integer = integer
         self.calibrate()
 
     def calibrate(self):
         """Calibrate using data stored in device."""
-        data = self._bus.read_i2c_block_data(self.addr,
-                                             self.CALIBRATION, 24)
-        self.dig_T1 = float(c_ushort((data[1] << 8) + data[0]).value)
-        self.dig_T2 = float(c_short((data[3] << 8) + data[2]).value)
-        self.dig_T3 = float(c_short((data[5] << 8) + data[4]).value)
-        self.dig_P1 = float(c_ushort((data[7] << 8) + data[6]).value)
-        self.dig_P2 = float(c_short((data[9] << 8) + data[8]).value)
-        self.dig_P3 = float(c_short((data[11] << 8) + data[10]).value)
-        self.dig_P4 = float(c_short((data[13] << 8) + data[12]).value)
-        self.dig_P5 = float(c_short((data[15] << 8) + data[14]).value)
-        self.dig_P6 = float(c_short((data[17] << 8) + data[16]).value)
-        self.dig_P7 = float(c_short((data[19] << 8) + data[18]).value)
-        self.dig_P8 = float(c_short((data[21] << 8) + data[20]).value)
-        self.dig_P9 = float(c_short((data[23] << 8) + data[22]).value)
+        with self._regs.exclusive():
+            data = self._regs.read(self.CALIBRATION, 24)
+        # T1 and P1 are unsigned, the rest signed (little endian)
+        coefficients = unpack('<HhhHhhhhhhhh', data)
+        (self.dig_T1, self.dig_T2, self.dig_T3,
+         self.dig_P1, self.dig_P2, self.dig_P3,
+         self.dig_P4, self.dig_P5, self.dig_P6,
+         self.dig_P7, self.dig_P8, self.dig_P9) = (
+            float(i) for i in coefficients)
+        T1, T2, T3, P1, P2, P3, P4, P5, P6, P7, P8, P9 = coefficients
+        # Constant terms of the compensation formulas
+        self._coef_T = (self.dig_T1 / 1024.0, self.dig_T1 / 8192.0,
+                        self.dig_T2, self.dig_T3)
+        self._coef_P = (self.dig_P1, self.dig_P2, self.dig_P3 / 524288.0,
+                        self.dig_P4 * 65536.0, self.dig_P5 * 2.0,
+                        self.dig_P6 / 32768.0, self.dig_P7,
+                        self.dig_P8 / 32768.0, self.dig_P9 / 2147483648.0)
+        self._int_T = (T1 << 1, T1, T2, T3)
+        self._int_P = (P1, P2, P3, P4 << 35, P5, P6, P7 << 4, P8, P9)
+
+    @property
+    def integer(self):
+        """
+        True if measurements are compensated with the integer (32-bit
+        temperature, 64-bit pressure) formulas of the datasheet, bit-exact
+        with its reference code. Results are then exact values
+        in the resolution of those formulas (0.01 °C, 1/256 Pa) instead
+        of rounded floating point values. Batch compensate() always uses
+        floating point formulas.
+        """
+        return self._integer
+
+    @integer.setter
+    def integer(self, value):
+        self._integer = bool(value)
+        self.t_fine = None  # t_fine of the other formulas is not usable
 
     @property
     def id(self):
         """Return chip ID - should be 88 (0x58)."""
-        return self._bus.read_byte_data(self.addr, self.ID)
+        return self._regs.read_byte(self.ID)
 
     def reset(self):
         """Reset all internal registers."""
-        self._bus.write_byte_data(self.addr, self.RESET,
-                                  self.SOFT_RESET)
+        self._regs.write_byte(self.RESET, self.SOFT_RESET)
+        self._regs.invalidate()
 
     @property
     def status(self):
         """Return current device status as tuple (measuring, im_update)."""
-        data = self._bus.read_byte_data(self.addr, self.STATUS)
+        data = self._regs.read_byte(self.STATUS)
         measuring = bool((data >> 3) % 2)
         im_update = bool(data % 2)
         return (measuring, im_update)
@@ -98,13 +159,12 @@ class BMP280(object):
     @property
     def ctrl_meas(self):
         """Return (raw) value of ctrl_meas register."""
-        return self._bus.read_byte_data(self.addr, self.CTRL_MEAS)
+        return self._regs.read_byte(self.CTRL_MEAS)
 
     def _ctrl_meas_set(self, osrs_t, osrs_p, mode):
         """Set ctrl_meas register (for internal use)."""
         data = (osrs_t << 5) + (osrs_p << 2) + mode
-        self._bus.write_byte_data(self.addr, self.CTRL_MEAS,
-                                  data)
+        self._regs.write_byte(self.CTRL_MEAS, data)
 
     def set_acquisition_options(self, temperature_oversampling,
                                 pressure_oversampling, mode):
@@ -155,12 +215,12 @@ class BMP280(object):
     @property
     def config(self):
         """Return (raw) value of config register."""
-        return self._bus.read_byte_data(self.addr, self.CONFIG)
+        return self._regs.read_byte(self.CONFIG)
 
     def _config_set(self, t_sb, _filter, spi3w_en):
         """Set config register (for internal use)."""
         data = (t_sb << 5) + (_filter << 2) + spi3w_en
-        self._bus.write_byte_data(self.addr, self.CONFIG, data)
+        self._regs.write_byte(self.CONFIG, data)
 
     def _set_config_internal(self, t_sb, filter_constant, spi_3wire):
         """Internal configuration function for easier BME280 support."""
@@ -211,41 +271,172 @@ class BMP280(object):
 
     def raw_pressure(self):
         """Return measured pressure (raw data)."""
-        data = self._bus.read_i2c_block_data(self.addr, self.PRESS, 3)
+        data = self._raw
+        self._regs.read_into(self.PRESS, data)
         return (data[0] << 12) + (data[1] << 4) + (data[2] >> 4)
 
     def raw_temperature(self):
         """Return measured temperature (raw data)."""
-        data = self._bus.read_i2c_block_data(self.addr, self.TEMP, 3)
+        data = self._raw
+        self._regs.read_into(self.TEMP, data)
         return (data[0] << 12) + (data[1] << 4) + (data[2] >> 4)
 
+    def raw_measurement(self):
+        """
+        Return all measurements (raw data) as tuple (pressure, temperature),
+        read in a single transaction (consistent with each other).
+        """
+        data = self._burst
+        self._regs.read_into(self.PRESS, data)
+        return ((data[0] << 12) + (data[1] << 4) + (data[2] >> 4),
+                (data[3] << 12) + (data[4] << 4) + (data[5] >> 4))
+
+    def _temperature(self, adc_T):
+        """
+        Return temperature in Celsius and t_fine (used by other
+        compensations) for raw temperature (for internal use).
+        Works with NumPy arrays as well.
+        """
+        T1a, T1b, T2, T3 = self._coef_T
+        var1 = (adc_T / 16384.0 - T1a) * T2
+        var2 = adc_T / 131072.0 - T1b
+        t_fine = var1 + var2 * var2 * T3
+        return t_fine / 5120.0, t_fine
+
+    def _temperature_int(self, adc_T):
+        """
+        Return temperature in 0.01 °C and t_fine for raw temperature,
+        using integer formulas (for internal use).
+        """
+        T1x2, T1, T2, T3 = self._int_T
+        var1 = (((adc_T >> 3) - T1x2) * T2) >> 11
+        var2 = (((((adc_T >> 4) - T1) * ((adc_T >> 4) - T1)) >> 12) *
+                T3) >> 14
+        t_fine = var1 + var2
+        return (t_fine * 5 + 128) >> 8, t_fine
+
+    def _pressure_int(self, adc_P, t_fine):
+        """
+        Return pressure in 1/256 Pa for raw pressure, using 64-bit
+        integer formulas (for internal use).
+        """
+        P1, P2, P3, P4x, P5, P6, P7x, P8, P9 = self._int_P
+        var1 = t_fine - 128000
+        var2 = var1 * var1 * P6
+        var2 = var2 + ((var1 * P5) << 17)
+        var2 = var2 + P4x
+        var1 = ((var1 * var1 * P3) >> 8) + ((var1 * P2) << 12)
+        var1 = (((1 << 47) + var1) * P1) >> 33
+        if var1 == 0:
+            return 0  # Avoid exception caused by division by zero
+        p = 1048576 - adc_P
+        p = _div((((p << 31) - var2) * 3125), var1)
+        var1 = (P9 * (p >> 13) * (p >> 13)) >> 25
+        var2 = (P8 * p) >> 19
+        return ((p + var1 + var2) >> 8) + P7x
+
+    def _compensate_temperature(self, adc_T):
+        """
+        Return temperature in Celsius and t_fine for raw temperature,
+        using selected formulas (for internal use).
+        """
+        if self._integer:
+            T, t_fine = self._temperature_int(adc_T)
+            return T / 100, t_fine
+        T, t_fine = self._temperature(adc_T)
+        return round(T, 2), t_fine
+
+    def _pressure_factors(self, t_fine):
+        """
+        Return terms of pressure compensation depending only
+        on temperature as tuple (var1, var2) (for internal use).
+        """
+        P1, P2, P3, P4, P5, P6 = self._coef_P[:6]
+        var1 = (t_fine / 2.0) - 64000.0
+        var2 = var1 * var1 * P6 + var1 * P5
+        var2 = (var2 / 4.0) + P4
+        var1 = (P3 * var1 * var1 + P2 * var1) / 524288.0
+        var1 = (1.0 + var1 / 32768.0) * P1
+        return var1, var2
+
+    def _pressure(self, adc_P, var1, var2):
+        """
+        Return pressure in Pascals for raw pressure and nonzero terms
+        from _pressure_factors() (for internal use).
+        """
+        P7, P8, P9 = self._coef_P[6:]
+        p = 1048576.0 - adc_P
+        p = (p - (var2 / 4096.0)) * 6250.0 / var1
+        return p + (P9 * p * p + p * P8 + P7) / 16.0
+
+    def _compensate_pressure(self, adc_P, t_fine):
+        """
+        Return pressure in Pascals for raw pressure, using selected
+        formulas (for internal use).
+        """
+        if self._integer:
+            return self._pressure_int(adc_P, t_fine) / 256
+        var1, var2 = self._pressure_factors(t_fine)
+        if var1 == 0.0:
+            return 0.0  # Avoid exception caused by division by zero
+        return round(self._pressure(adc_P, var1, var2), 1)
+
     def temperature(self):
         """Return measured temperature in Celsius."""
-        adc_T = float(self.raw_temperature())
-        var1 = (adc_T / 16384.0 - self.dig_T1 / 1024.0) * self.dig_T2
-        var2 = ((adc_T / 131072.0 - self.dig_T1 / 8192.0) *
-                (adc_T / 131072.0 - self.dig_T1 / 8192.0)) * self.dig_T3
-        self.t_fine = (var1 + var2)
-        T = (var1 + var2) / 5120.0
-        return round(T, 2)
+        T, self.t_fine = self._compensate_temperature(self.raw_temperature())
+        return T
 
     def pressure(self, update_temperature=True):
         """Return measured pressure in Pascals."""
         if (self.t_fine is None) or update_temperature:
             self.temperature()
-        adc_P = float(self.raw_pressure())
-        var1 = (self.t_fine / 2.0) - 64000.0
-        var2 = var1 * var1 * self.dig_P6 / 32768.0
-        var2 = var2 + var1 * self.dig_P5 * 2.0
-        var2 = (var2 / 4.0) + (self.dig_P4 * 65536.0)
-        var1 = (self.dig_P3 * var1 * var1 / 524288.0 +
-                self.dig_P2 * var1) / 524288.0
-        var1 = (1.0 + var1 / 32768.0) * self.dig_P1
-        if var1 == 0.0:
-            return 0.0  # Avoid exception caused by division by zero
-        p = 1048576.0 - adc_P
-        p = (p - (var2 / 4096.0)) * 6250.0 / var1
-        var1 = self.dig_P9 * p * p / 2147483648.0
-        var2 = p * self.dig_P8 / 32768.0
-        p = p + (var1 + var2 + self.dig_P7) / 16.0
-        return round(p, 1)
+        return self._compensate_pressure(self.raw_pressure(), self.t_fine)
+
+    def measure(self):
+        """
+        Return measured temperature in Celsius and pressure in Pascals
+        as tuple (temperature, pressure), from a single burst read
+        of all measurement registers (as recommended by datasheet).
+        """
+        adc_P, adc_T = self.raw_measurement()
+        T, self.t_fine = self._compensate_temperature(adc_T)
+        return T, self._compensate_pressure(adc_P, self.t_fine)
+
+    @classmethod
+    def decode_measurements(cls, data):
+        """
+        Return raw measurements stored in data (results of raw burst
+        reads of all measurement registers, one after another) as tuple
+        of NumPy arrays (pressure, temperature).
+        """
+        numpy = _numpy()
+        data = numpy.frombuffer(data, numpy.uint8).reshape(
+            -1, cls.MEASUREMENT_LENGTH).astype(numpy.int64)
+        return ((data[:, 0] << 12) + (data[:, 1] << 4) + (data[:, 2] >> 4),
+                (data[:, 3] << 12) + (data[:, 4] << 4) + (data[:, 5] >> 4))
+
+    def _compensate_arrays(self, adc_P, adc_T):
+        """
+        Return temperature, pressure and t_fine arrays for raw data
+        (for internal use).
+        """
+        numpy = _numpy()
+        T, t_fine = self._temperature(numpy.asarray(adc_T, numpy.float64))
+        var1, var2 = self._pressure_factors(t_fine)
+        valid = var1 != 0.0
+        P = self._pressure(numpy.asarray(adc_P, numpy.float64),
+                           numpy.where(valid, var1, 1.0), var2)
+        return T, numpy.where(valid, P, 0.0), t_fine
+
+    def compensate(self, adc_P, adc_T):
+        """
+        Return temperatures in Celsius and pressures in Pascals
+        for sequences of raw measurements (e.g. logged values of
+        raw_measurement() or results of decode_measurements()),
+        as tuple of NumPy arrays (temperature, pressure).
+
+        The whole batch is compensated with vectorized NumPy operations,
+        values are not rounded.
+        """
+        T, P, _ = self._compensate_arrays(adc_P, adc_T)
+        return T, P
@@ -0,0 +1,151 @@
+"""
+This module defines locks used to serialize access to shared buses.
+"""
+
+from fcntl import LOCK_EX, LOCK_NB, LOCK_UN, flock
+from heapq import heapify, heappop, heappush
+from itertools import count
+from os import O_CLOEXEC, O_CREAT, O_NOFOLLOW, O_RDWR, close, open as os_open
+from threading import Condition, Lock, get_ident
+from time import monotonic
+
+
+class PriorityLock(object):
+
+    """
+    Reentrant lock granting ownership to waiting threads in order
+    of priority (lower value first), then in order of arrival.
+
+    When lock is held for single transactions only, a waiting
+    high priority thread is delayed by at most one transaction
+    of lower priority, no matter how many of them are queued.
+    """
+
+    def __init__(self) -> None:
+        self._cond = Condition(Lock())
+        self._owner = None
+        self._count = 0
+        self._waiters = []  # heap of (priority, arrival number)
+        self._arrival = count()
+
+    def acquire(self, priority: int=1, blocking: bool=True,
+                timeout: float=-1) -> bool:
+        """Acquire the lock, return True on success."""
+        me = get_ident()
+        with self._cond:
+            if self._owner == me:
+                self._count += 1
+                return True
+            if self._owner is None and not self._waiters:
+                self._owner = me
+                self._count = 1
+                return True
+            if not blocking:
+                return False
+            entry = (priority, next(self._arrival))
+            heappush(self._waiters, entry)
+            deadline = None if timeout < 0 else monotonic() + timeout
+            while self._owner is not None or self._waiters[0] != entry:
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        self._waiters.remove(entry)
+                        heapify(self._waiters)
+                        self._cond.notify_all()
+                        return False
+                self._cond.wait(remaining)
+            heappop(self._waiters)
+            self._owner = me
+            self._count = 1
+            return True
+
+    def release(self) -> None:
+        """Release the lock."""
+        with self._cond:
+            if self._owner != get_ident():
+                raise RuntimeError('cannot release un-acquired lock')
+            self._count -= 1
+            if self._count == 0:
+                self._owner = None
+                if self._waiters:
+                    self._cond.notify_all()
+
+    def locked(self) -> bool:
+        """Return True if the lock is held by any thread."""
+        return self._owner is not None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+        return False
+
+
+class FileLock(object):
+
+    """
+    Reentrant advisory lock shared between processes
+    (flock on a lock file, created if it does not exist).
+
+    It does not exclude threads of the same process, so it must be
+    held by one thread at a time - acquire it while holding a thread
+    lock (see I2CBus.exclusive). The file is kept open between uses,
+    so an uncontended acquire costs a single system call.
+
+    The file is created with the specified mode (minus umask), the
+    default lets processes of the file's group share the lock.
+    Symbolic links are not followed, so that a link planted in
+    a shared directory cannot redirect the lock to another file.
+    """
+
+    def __init__(self, path: str, mode: int=0o660) -> None:
+        self.path = path
+        self.mode = mode
+        self._fd = None
+        self._count = 0
+
+    def acquire(self, blocking: bool=True) -> bool:
+        """Acquire the lock, return True on success."""
+        if self._count:
+            self._count += 1
+            return True
+        if self._fd is None:
+            self._fd = os_open(self.path,
+                               O_RDWR | O_CREAT | O_NOFOLLOW | O_CLOEXEC,
+                               self.mode)
+        try:
+            flock(self._fd, LOCK_EX if blocking else LOCK_EX | LOCK_NB)
+        except BlockingIOError:
+            return False
+        self._count = 1
+        return True
+
+    def release(self) -> None:
+        """Release the lock."""
+        if not self._count:
+            raise RuntimeError('cannot release un-acquired lock')
+        self._count -= 1
+        if not self._count:
+            flock(self._fd, LOCK_UN)
+
+    def locked(self) -> bool:
+        """Return True if the lock is held by this process."""
+        return self._count > 0
+
+    def close(self) -> None:
+        """Close the lock file (releasing the lock)."""
+        fd, self._fd = self._fd, None
+        self._count = 0
+        if fd is not None:
+            close(fd)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+        return False
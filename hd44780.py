@@ -1,5 +1,6 @@
 from time import sleep
 
+from i2c import I2CBus
 from pcf8574 import PCF8574
 
 class HD44780(object):
@@ -130,6 +131,8 @@ class HD44780(object):
         backlight pin at the end.
         """
         self.pcf8574 = PCF8574(address, bus)
+        # Display refresh is bulk traffic, let other devices in between
+        self.pcf8574._bus.priority = I2CBus.PRIORITY_BULK
         self.en = en
         self.rs = rs
         self.rw = rw
@@ -24,7 +24,7 @@ class HT16K33(object):
     def __init__(self, address=0x70, bus=None):
         """Create object representing HT16K33 chip."""
         self.address = address
-        self._bus = I2CBus(bus)
+        self._bus = I2CBus(bus, priority=I2CBus.PRIORITY_BULK)
         self._buffer = [0x0000] * 8
         self.oscillator(True)
         self.blink(0)
@@ -15,29 +15,86 @@ module usually must have root permissions.
 #     linux.git/plain/Documentation/i2c/smbus-protocol
 
 
-from re import match as re_match
+from contextlib import contextmanager
+from errno import EBADF, EBUSY, EHOSTDOWN, ETIMEDOUT
+from os import environ
+from threading import Lock
 try:
     from typing import List
 except ImportError as err:
     raise ImportError(
         'Typing module must be manually installed on Python < 3.5') from err
 
-try:
-    from smbus import SMBus
-except ImportError:
-    # Try smbus2
-    try:
-        from smbus2 import SMBus
-    except ImportError:
-        # Try Adafruit PureIO
+from buslock import FileLock, PriorityLock
+from i2chealth import CircuitBreaker
+from i2cstats import I2CStats
+
+# SMBus backend class, selected on first use (see _backend)
+_smbus_class = None
+
+
+def _backend():
+    """
+    Return SMBus backend class, importing it on first use:
+    smbus, smbus2, Adafruit PureIO or built-in i2cdev, whichever
+    is available first.
+    """
+    global _smbus_class
+    if _smbus_class is None:
         try:
-            from Adafruit_PureIO.smbus import SMBus
-        except ImportError as err:
-                raise ImportError('No SMBus module installed') from err
+            from smbus import SMBus
+        except ImportError:
+            # Try smbus2
+            try:
+                from smbus2 import SMBus
+            except ImportError:
+                # Try Adafruit PureIO
+                try:
+                    from Adafruit_PureIO.smbus import SMBus
+                except ImportError:
+                    # Fall back to built-in ioctl implementation
+                    from i2cdev import I2CDev as SMBus
+        _smbus_class = SMBus
+    return _smbus_class
+
+
+def __getattr__(name: str):
+    # Module attribute SMBus is resolved lazily (Python >= 3.7)
+    if name == 'SMBus':
+        return _backend()
+    raise AttributeError(
+        'module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def set_default_smbus(smbus=None) -> None:
+    """
+    Set SMBus class used by I2CBus objects created without
+    the smbus argument (including those created by device drivers),
+    e.g. a simulated bus from the i2csim module.
+    None restores the automatically selected class.
+    """
+    I2CBus._default_smbus = smbus
+
+
+# Detected revision of Raspberry Pi board (see _getPiRevision)
+_pi_revision = None
 
 
 def _getPiRevision() -> int:
-    """Get the version number of the Raspberry Pi board."""
+    """
+    Get the version number of the Raspberry Pi board
+    (detected once per process).
+    """
+    global _pi_revision
+    if _pi_revision is None:
+        _pi_revision = _readPiRevision()
+    return _pi_revision
+
+
+def _readPiRevision() -> int:
+    """Read the version number of the Raspberry Pi board."""
+    from re import match as re_match
+
     # Revision list available at:
     # http://elinux.org/RPi_HardwareHistory#Board_Revision_History
     try:
@@ -66,6 +123,107 @@ class I2CError(OSError):
     pass
 
 
+class I2CDeviceUnavailable(I2CError):
+    pass
+
+
+class I2CMessage(object):
+
+    """
+    Single message of a combined I2C transaction (see I2CBus.transfer).
+
+    Mirrors the kernel i2c_msg structure: target address, flags
+    and a data buffer, which is filled in place for read messages.
+    """
+
+    I2C_M_RD = 0x0001
+
+    __slots__ = ('addr', 'flags', 'buf')
+
+    def __init__(self, addr: int, flags: int, buf: bytearray) -> None:
+        self.addr = addr
+        self.flags = flags
+        self.buf = buf
+
+    def __repr__(self):
+        return 'I2CMessage({}, {}, {})'.format(
+            hex(self.addr), 'read' if self.is_read else 'write',
+            list(self.buf))
+
+    @classmethod
+    def read(cls, addr: int, length: int) -> 'I2CMessage':
+        """Create message reading length bytes from the device."""
+        return cls(addr, cls.I2C_M_RD, bytearray(length))
+
+    @classmethod
+    def write(cls, addr: int, data) -> 'I2CMessage':
+        """Create message writing data (bytes or list) to the device."""
+        return cls(addr, 0, bytearray(data))
+
+    @property
+    def is_read(self) -> bool:
+        """True if this is a read message."""
+        return bool(self.flags & self.I2C_M_RD)
+
+
+class _SharedBus(object):
+
+    """
+    Open SMBus handle shared by all I2CBus objects
+    connected to the same bus with the same SMBus class.
+    """
+
+    def __init__(self, key, bus) -> None:
+        self.key = key
+        self.bus = bus
+        self.refs = 0
+        self.lock = PriorityLock()
+        self.file_lock = None
+        self.stats = None
+        self.trace = None
+        self.breaker = None
+        self.worker = None
+        self.hung = None  # address of timed out transaction in progress
+        self.pec = False  # PEC setting of the SMBus object
+        self.rdwr = None  # I2C_RDWR support (queried on first use)
+
+
+# Registry of open handles, keyed by (bus number, SMBus class)
+_shared = {}
+_shared_lock = Lock()
+
+
+def _acquire(bus: int, smbus, shared: bool=True) -> _SharedBus:
+    """Get (and open if needed) a handle for the specified bus."""
+    if not shared:
+        handle = _SharedBus(None, smbus(bus))
+        handle.refs = 1
+        return handle
+    key = (bus, smbus)
+    with _shared_lock:
+        handle = _shared.get(key)
+        if handle is None:
+            handle = _SharedBus(key, smbus(bus))
+            _shared[key] = handle
+        handle.refs += 1
+    return handle
+
+
+def _release(handle: _SharedBus) -> None:
+    """Drop a reference to the handle, closing it after the last one."""
+    with _shared_lock:
+        handle.refs -= 1
+        if handle.refs > 0:
+            return
+        if _shared.get(handle.key) is handle:
+            del _shared[handle.key]
+    if handle.file_lock is not None:
+        handle.file_lock.close()
+    if handle.worker is not None:
+        handle.worker.shutdown(wait=False)
+    handle.bus.close()
+
+
 class I2CBus(object):
 
     """
@@ -77,8 +235,34 @@ class I2CBus(object):
     connection.
 
     Bus number -1 disables automatic connection on Raspberry Pi.
+
+    Objects connected to the same bus share one open SMBus handle,
+    which is closed when the last of them is closed.
+    Use shared=False to get a private handle instead.
+
+    Transactions of objects sharing a handle are executed in order
+    of their priority (PRIORITY_HIGH first), so a latency-critical
+    transaction waits for at most one transaction in progress.
+
+    With interprocess=True (or the I2C_INTERPROCESS_LOCK environment
+    variable set to 1), multi-transaction sequences in exclusive()
+    blocks are also serialized with other processes, using flock
+    on a lock file of the bus (see LOCK_PATH).
+
+    With timeout set (in seconds), transactions are executed by
+    a worker thread of the bus and I2CError (ETIMEDOUT) is raised
+    if they do not finish in time (time spent waiting for the bus
+    does not count). Until a timed out transaction finishes, other
+    transactions on the bus fail at once with I2CError (EBUSY).
+    See enable_breaker() for failing fast on devices which stopped
+    responding.
     """
 
+    # Transaction priorities (lower value is served first)
+    PRIORITY_HIGH = 0
+    PRIORITY_NORMAL = 1
+    PRIORITY_BULK = 2
+
     @staticmethod
     def _error(addr, err):
         if err.errno == 5:
@@ -107,7 +291,13 @@ class I2CBus(object):
         """
         Get the I2C bus number of the Raspberry Pi board,
         or -1 if cannot be determined (not Rasperry Pi).
+
+        Detection can be overridden with the I2C_BUS environment
+        variable (bus number, -1 disables automatic connection).
         """
+        override = environ.get('I2C_BUS')
+        if override:
+            return int(override)
         rev = _getPiRevision()
         if rev > 1:
             return 1
@@ -122,13 +312,16 @@ class I2CBus(object):
 
         PEC adds a CRC-8 error-checking byte to transfers using it,
         immediately before the terminating STOP.
+        The setting belongs to this object, it does not affect other
+        objects sharing the bus handle.
         """
         try:
-            return self.bus.pec
+            self.bus.pec
         except AttributeError as err:
             raise NotImplementedError(
                 'This SMBus implementation does not support this feature.'
             ) from err
+        return self._pec
 
     @pec.setter
     def pec(self, val):
@@ -138,30 +331,89 @@ class I2CBus(object):
             raise NotImplementedError(
                 'This SMBus implementation does not support this feature.'
             ) from err
-        self.bus.pec = val
+        self._pec = bool(val)
 
     @pec.deleter
     def pec(self):
         raise TypeError('Cannot delete attribute')
 
-    def __init__(self, bus: int=None, *, smbus=SMBus) -> None:
+    @property
+    def lock(self):
+        """
+        Reentrant lock serializing access to the shared bus handle.
+
+        Hold it to perform multi-transaction sequences atomically
+        with respect to other threads using the same bus
+        (this delays high priority transactions of other objects).
+        """
+        return self._lock
+
+    @contextmanager
+    def exclusive(self):
+        """
+        Context manager performing a multi-transaction sequence
+        atomically: holds the bus lock and, with inter-process locking
+        enabled, the lock file of the bus.
+
+            with bus.exclusive():
+                bus.write_i2c_block_data(addr, cmd, request)
+                response = bus.read_i2c_block_data(addr, 0, length)
+        """
+        self._lock.acquire(self.priority)
+        try:
+            file_lock = self._file_lock
+            if file_lock is None:
+                yield self
+            else:
+                file_lock.acquire()
+                try:
+                    yield self
+                finally:
+                    file_lock.release()
+        finally:
+            self._lock.release()
+
+    # SMBus class used when none is specified (see set_default_smbus)
+    _default_smbus = None
+
+    # Lock file used for inter-process locking of bus number
+    # (/run/lock is only writable by root on some systems, point it
+    # to a directory writable by the processes sharing the bus)
+    LOCK_PATH = '/run/lock/i2c-{}.lock'
+
+    def __init__(self, bus: int=None, *, smbus=None,
+                 shared: bool=True, priority: int=PRIORITY_NORMAL,
+                 interprocess: bool=None, timeout: float=None) -> None:
+        if smbus is None:
+            smbus = self._default_smbus or _backend()
+        if interprocess is None:
+            interprocess = environ.get('I2C_INTERPROCESS_LOCK') == '1'
+        self._smbus = smbus
+        self.priority = priority
+        self.timeout = timeout
+        self._batch = None
+        self._cache = {}
+        self._pec = False
+        self._shared = shared
+        self._interprocess = interprocess
+        self._file_lock = None
+        self._handle = None
         if bus is None:
             bus = self.getPiI2CBusNumber()
 
+        self.busnum = bus
         if bus != -1:
-            try:
-                self.bus = smbus(bus)
-            except FileNotFoundError as err:
-                raise FileNotFoundError('Specified I2C bus not found') from err
-            except OSError as err:
-                raise I2CError(
-                    err.errno, 'Could not connect to I2C bus') from err
+            self._connect(bus)
         else:
-            self.bus = smbus()
+            self._handle = _SharedBus(None, smbus())
+            self._handle.refs = 1
+            self.bus = self._handle.bus
+            self._lock = self._handle.lock
 
     def __del__(self):
         """Clean up any resources used by the I2C instance."""
-        self.close()
+        if getattr(self, '_handle', None) is not None:
+            self.close()
 
     def __enter__(self):
         """Context manager enter function."""
@@ -172,35 +424,360 @@ class I2CBus(object):
         self.close()
         return False  # Don't suppress exceptions.
 
-    def open(self, bus: int) -> None:
-        """Connect the object to the specified SMBus."""
+    def _connect(self, bus: int) -> None:
+        """Attach the object to the handle of the specified bus."""
         try:
-            self.bus.open(bus)
+            self._handle = _acquire(bus, self._smbus, self._shared)
         except FileNotFoundError as err:
             raise FileNotFoundError('Specified I2C bus not found') from err
         except OSError as err:
             raise I2CError(err.errno, 'Could not connect to I2C bus') from err
+        self.bus = self._handle.bus
+        self._lock = self._handle.lock
+        self.busnum = bus
+        if self._interprocess:
+            with _shared_lock:
+                if self._handle.file_lock is None:
+                    self._handle.file_lock = FileLock(
+                        self.LOCK_PATH.format(bus))
+            self._file_lock = self._handle.file_lock
 
-    def close(self) -> None:
-        """Disconnect the object from the bus."""
-        self.bus.close()
+    def _call(self, name: str, addr: int, *args):
+        """Perform the named SMBus transaction (for internal use)."""
+        key = None
+        if self._cache and name in self._WRITES:
+            key = (addr, args[0] if len(args) > 1 else None)
+            if key in self._cache:
+                value = (name, tuple(args[-1]) if isinstance(
+                    args[-1], (list, tuple, bytes, bytearray)) else args[-1])
+                if self._cache[key] == value:
+                    return None
+                self._cache[key] = value
+            else:
+                key = None
+        if self._batch is not None:
+            if name in self._WRITES:
+                self._batch.append((name, addr, args))
+                return None
+            self._flush()
+        try:
+            return self._dispatch(name, addr, *args)
+        except Exception:
+            if key is not None:
+                self._cache[key] = None
+            raise
 
-    # SMBus Access
-    def write_quick(self, addr: int) -> None:
+    def _dispatch(self, name: str, addr: int, *args):
+        """Send the named SMBus transaction to the bus (for internal use)."""
+        handle = self._handle
+        if handle is None:
+            raise self._error(addr, OSError(EBADF, 'Bus closed'))
+        return self._perform(handle, None, name, addr, args)
+
+    def _perform(self, handle: _SharedBus, func, name: str,
+                 addr: int, args: tuple):
         """
-        Perform SMBus Quick transaction.
+        Perform transaction func(addr, *args) (default: the named
+        method of the backend) on the bus, subject to the circuit
+        breaker and timeout (for internal use).
+        """
+        breaker = handle.breaker
+        if breaker is not None and not breaker.allow(addr):
+            raise I2CDeviceUnavailable(
+                EHOSTDOWN,
+                'Error accessing address {}: I2C device failing, '
+                'not retried yet'.format(hex(addr)))
+        handle.lock.acquire(self.priority)
+        try:
+            if handle.hung is not None:
+                raise I2CError(
+                    EBUSY,
+                    'Error accessing address {}: I2C bus busy with timed '
+                    'out transaction of address {}'.format(
+                        hex(addr), hex(handle.hung)))
+            if self.timeout is None:
+                return self._execute(handle, func, name, addr, args)
+            return self._timed(handle, func, name, addr, args)
+        finally:
+            handle.lock.release()
 
-        This sends a single bit to the device,
-        at the place of the Rd/Wr bit.
+    def _timed(self, handle: _SharedBus, func, name: str,
+               addr: int, args: tuple):
         """
+        Execute transaction by the worker thread of the bus, raising
+        ETIMEDOUT if it does not finish in time (call with the bus lock
+        held, for internal use).
+        """
+        from concurrent.futures import ThreadPoolExecutor, TimeoutError
+        worker = handle.worker
+        if worker is None:
+            worker = handle.worker = ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix='i2c-{}'.format(self.busnum))
+        # The worker is idle (transactions are submitted with the bus
+        # lock held and none is hung), so the timeout only covers
+        # this transaction
+        future = worker.submit(self._execute, handle, func, name, addr, args)
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            # The backend is still in use by the transaction, so others
+            # fail until it finishes
+            handle.hung = addr
+            future.add_done_callback(
+                lambda future: setattr(handle, 'hung', None))
+            if handle.breaker is not None:
+                handle.breaker.failure(addr)
+            raise I2CError(
+                ETIMEDOUT,
+                'Error accessing address {}: I2C transaction timed out'.format(
+                    hex(addr))) from None
+
+    def _execute(self, handle: _SharedBus, func, name: str,
+                 addr: int, args: tuple):
+        """Execute transaction (for internal use)."""
         try:
-            return self.bus.write_quick(addr)
+            if handle.pec != self._pec:
+                handle.bus.pec = self._pec
+                handle.pec = self._pec
+            if func is None:
+                func = getattr(handle.bus, name)
+            if handle.stats is None and handle.trace is None:
+                result = func(addr, *args)
+            else:
+                result = self._monitored(handle, func, name, addr, args)
+        except I2CError as err:
+            # Already describes the failed device (e.g. pipelined writes
+            # of i2cd.I2CProxy, with its address in addr)
+            if handle.breaker is not None:
+                handle.breaker.failure(getattr(err, 'addr', addr))
+            raise
         except OSError as err:
+            if handle.breaker is not None:
+                handle.breaker.failure(addr)
             raise self._error(addr, err) from err
         except AttributeError as err:
             raise NotImplementedError(
                 'This SMBus implementation does not support this feature.'
             ) from err
+        if handle.breaker is not None:
+            handle.breaker.success(addr)
+        return result
+
+    @staticmethod
+    def _monitored(handle, func, name: str, addr: int, args: tuple):
+        """Perform transaction with statistics and/or trace recording."""
+        for monitor in (handle.trace, handle.stats):
+            if monitor is not None:
+                func = (lambda monitor, func: lambda addr, *args:
+                        monitor.call(func, name, addr, args))(monitor, func)
+        return func(addr, *args)
+
+    # Write operations (deferred while batching, subject to caching)
+    _WRITES = frozenset(['write_byte', 'write_byte_data', 'write_word_data',
+                          'write_block_data', 'write_i2c_block_data'])
+
+    @contextmanager
+    def batch(self, auto_increment: bool=False):
+        """
+        Context manager deferring write transactions.
+
+        Writes made inside the block are recorded and sent on exit,
+        back to back while holding the bus lock (unless the object has
+        PRIORITY_BULK, then other transactions may be interleaved).
+        Any other transaction sends the recorded writes first,
+        so ordering is preserved.
+        If the block raises an exception, unsent writes are dropped.
+
+        With auto_increment=True, byte and I2C block writes to
+        adjacent or overlapping registers of the same device are merged
+        into I2C block writes (up to 32 bytes). Use it only for devices
+        whose registers behave as plain memory with address
+        auto-increment (like SN3218 PWM registers).
+        """
+        if self._batch is not None:
+            # Nested batch - outermost one sends the writes
+            yield self
+            return
+        self._batch = []
+        self._batch_merge = auto_increment
+        try:
+            yield self
+            self._flush()
+        finally:
+            dropped, self._batch = self._batch, None
+            # Cached values of dropped writes were never sent
+            for name, addr, args in dropped:
+                key = (addr, args[0] if len(args) > 1 else None)
+                if key in self._cache:
+                    self._cache[key] = None
+
+    def _flush(self) -> None:
+        """Send writes recorded by batch() (for internal use)."""
+        ops, self._batch = self._batch, None
+        if self._batch_merge:
+            ops = self._merge(ops)
+        try:
+            if self.priority < self.PRIORITY_BULK:
+                with self.exclusive():
+                    for name, addr, args in ops:
+                        self._dispatch(name, addr, *args)
+            else:
+                for name, addr, args in ops:
+                    self._dispatch(name, addr, *args)
+        except Exception:
+            self.invalidate()
+            raise
+        finally:
+            self._batch = []
+
+    @staticmethod
+    def _merge(ops):
+        """Merge adjacent register writes into block writes."""
+        merged = []
+        last = None  # [addr, start register, data] of last block write
+        for name, addr, args in ops:
+            if name == 'write_byte_data':
+                cmd, data = args[0], [args[1]]
+            elif name == 'write_i2c_block_data':
+                cmd, data = args[0], list(args[1])
+            else:
+                merged.append((name, addr, args))
+                last = None
+                continue
+            if (last is not None and last[0] == addr and
+                    last[1] <= cmd <= last[1] + len(last[2]) and
+                    max(len(last[2]), cmd - last[1] + len(data)) <= 32):
+                offset = cmd - last[1]
+                last[2][offset:offset + len(data)] = data
+                continue
+            last = [addr, cmd, data]
+            merged.append(('write_i2c_block_data', addr, last))
+        result = []
+        for name, addr, args in merged:
+            if name == 'write_i2c_block_data' and isinstance(args, list):
+                _, cmd, data = args
+                if len(data) == 1:
+                    result.append(('write_byte_data', addr, (cmd, data[0])))
+                else:
+                    result.append((name, addr, (cmd, data)))
+            else:
+                result.append((name, addr, args))
+        return result
+
+    @property
+    def stats(self) -> I2CStats:
+        """Statistics of the bus, or None if not enabled."""
+        if self._handle is None:
+            return None
+        return self._handle.stats
+
+    def enable_stats(self) -> I2CStats:
+        """
+        Start collecting transaction statistics of the bus.
+
+        Statistics are shared by all objects using the same bus handle.
+        Use stats.snapshot() to read them. Returns the statistics object.
+        """
+        handle = self._handle
+        if handle.stats is None:
+            handle.stats = I2CStats()
+        return handle.stats
+
+    def disable_stats(self) -> None:
+        """Stop collecting transaction statistics of the bus."""
+        self._handle.stats = None
+
+    @property
+    def health(self) -> dict:
+        """
+        State of failing devices on the bus (see CircuitBreaker.snapshot),
+        or None if the circuit breaker is not enabled.
+        """
+        if self._handle is None or self._handle.breaker is None:
+            return None
+        return self._handle.breaker.snapshot()
+
+    def enable_breaker(self, threshold: int=3, backoff: float=1.0,
+                       max_backoff: float=60.0) -> None:
+        """
+        Start tracking health of devices on the bus.
+
+        After threshold consecutive errors, transactions with the device
+        raise I2CDeviceUnavailable without accessing the bus, except
+        for a probe after backoff seconds (doubling after each failed
+        probe up to max_backoff). Shared by all objects using the same
+        bus handle.
+        """
+        self._handle.breaker = CircuitBreaker(threshold, backoff, max_backoff)
+
+    def disable_breaker(self) -> None:
+        """Stop tracking health of devices on the bus."""
+        self._handle.breaker = None
+
+    def start_trace(self, path: str) -> None:
+        """
+        Start recording all transactions on the bus into a trace file
+        (see i2ctrace module for the format and replay).
+        """
+        from i2ctrace import TraceRecorder
+        handle = self._handle
+        self.stop_trace()
+        handle.trace = TraceRecorder(path, self.busnum)
+
+    def stop_trace(self) -> None:
+        """Stop recording transactions and close the trace file."""
+        handle = self._handle
+        trace, handle.trace = handle.trace, None
+        if trace is not None:
+            trace.close()
+
+    def cache_registers(self, addr: int, *cmds: int) -> None:
+        """
+        Enable write caching for specified registers of a device.
+
+        The last value written to each of these registers is remembered
+        and writes that would not change it are skipped. Register None
+        stands for write_byte (a write without register number).
+        Only use it for registers where writes have no side effects
+        other than storing the value.
+        """
+        for cmd in cmds:
+            self._cache.setdefault((addr, cmd), None)
+
+    def invalidate(self, addr: int=None, cmd: int=None) -> None:
+        """
+        Forget cached register values, so that next writes are sent.
+
+        Invalidates all cached registers, all registers of a device,
+        or a single register. Call it after resetting a device.
+        """
+        for key in self._cache:
+            if addr is None or (key[0] == addr and (
+                    cmd is None or key[1] == cmd)):
+                self._cache[key] = None
+
+    def open(self, bus: int) -> None:
+        """Connect the object to the specified SMBus."""
+        self.close()
+        self._connect(bus)
+
+    def close(self) -> None:
+        """Disconnect the object from the bus."""
+        handle, self._handle = self._handle, None
+        self._file_lock = None
+        if handle is not None:
+            _release(handle)
+
+    # SMBus Access
+    def write_quick(self, addr: int) -> None:
+        """
+        Perform SMBus Quick transaction.
+
+        This sends a single bit to the device,
+        at the place of the Rd/Wr bit.
+        """
+        return self._call('write_quick', addr)
 
     def read_byte(self, addr: int) -> int:
         """
@@ -212,14 +789,7 @@ class I2CBus(object):
         for others, it is a shorthand if you want to read
         the same register as in the previous SMBus command.
         """
-        try:
-            return self.bus.read_byte(addr)
-        except OSError as err:
-            raise self._error(addr, err) from err
-        except AttributeError as err:
-            raise NotImplementedError(
-                'This SMBus implementation does not support this feature.'
-            ) from err
+        return self._call('read_byte', addr)
 
     def write_byte(self, addr: int, val: int) -> None:
         """
@@ -229,14 +799,7 @@ class I2CBus(object):
         it sends a single byte to a device.
         See Receive Byte for more information.
         """
-        try:
-            return self.bus.write_byte(addr, val)
-        except OSError as err:
-            raise self._error(addr, err) from err
-        except AttributeError as err:
-            raise NotImplementedError(
-                'This SMBus implementation does not support this feature.'
-            ) from err
+        return self._call('write_byte', addr, val)
 
     def read_byte_data(self, addr: int, cmd: int) -> int:
         """
@@ -246,14 +809,7 @@ class I2CBus(object):
         from a designated register.
         The register is specified through the Comm byte.
         """
-        try:
-            return self.bus.read_byte_data(addr, cmd)
-        except OSError as err:
-            raise self._error(addr, err) from err
-        except AttributeError as err:
-            raise NotImplementedError(
-                'This SMBus implementation does not support this feature.'
-            ) from err
+        return self._call('read_byte_data', addr, cmd)
 
     def write_byte_data(self, addr: int, cmd: int, val: int) -> None:
         """
@@ -264,14 +820,7 @@ class I2CBus(object):
         through the Comm byte. This is the opposite of
         the Read Byte operation.
         """
-        try:
-            return self.bus.write_byte_data(addr, cmd, val)
-        except OSError as err:
-            raise self._error(addr, err) from err
-        except AttributeError as err:
-            raise NotImplementedError(
-                'This SMBus implementation does not support this feature.'
-            ) from err
+        return self._call('write_byte_data', addr, cmd, val)
 
     def read_word_data(self, addr: int, cmd: int) -> int:
         """
@@ -282,14 +831,7 @@ class I2CBus(object):
         that is specified through the Comm byte.
         But this time, the data is a complete word (16 bits).
         """
-        try:
-            return self.bus.read_word_data(addr, cmd)
-        except OSError as err:
-            raise self._error(addr, err) from err
-        except AttributeError as err:
-            raise NotImplementedError(
-                'This SMBus implementation does not support this feature.'
-            ) from err
+        return self._call('read_word_data', addr, cmd)
 
     def write_word_data(self, addr: int, cmd: int, val: int) -> None:
         """
@@ -299,14 +841,7 @@ class I2CBus(object):
         of data is written to a device, to the designated register
         that is specified through the Comm byte.
         """
-        try:
-            return self.bus.write_word_data(addr, cmd, val)
-        except OSError as err:
-            raise self._error(addr, err) from err
-        except AttributeError as err:
-            raise NotImplementedError(
-                'This SMBus implementation does not support this feature.'
-            ) from err
+        return self._call('write_word_data', addr, cmd, val)
 
     def read_word_swapped(self, addr: int, cmd: int) -> int:
         """
@@ -334,14 +869,7 @@ class I2CBus(object):
         sends 16 bits of data to it,
         and reads 16 bits of data in return.
         """
-        try:
-            return self.bus.process_call(addr, cmd, val)
-        except OSError as err:
-            raise self._error(addr, err) from err
-        except AttributeError as err:
-            raise NotImplementedError(
-                'This SMBus implementation does not support this feature.'
-            ) from err
+        return self._call('process_call', addr, cmd, val)
 
     def read_block_data(self, addr: int, cmd: int) -> List[int]:
         """
@@ -352,14 +880,7 @@ class I2CBus(object):
         through the Comm byte. The amount of data
         is specified by the device in the Count byte.
         """
-        try:
-            return self.bus.read_block_data(addr, cmd)
-        except OSError as err:
-            raise self._error(addr, err) from err
-        except AttributeError as err:
-            raise NotImplementedError(
-                'This SMBus implementation does not support this feature.'
-            ) from err
+        return self._call('read_block_data', addr, cmd)
 
     def write_block_data(self, addr: int, cmd: int, vals: List[int]) -> None:
         """
@@ -370,14 +891,7 @@ class I2CBus(object):
         to a designated register that is specified through the
         Comm byte. The amount of data is specified in the Count byte.
         """
-        try:
-            return self.bus.write_block_data(addr, cmd, vals)
-        except OSError as err:
-            raise self._error(addr, err) from err
-        except AttributeError as err:
-            raise NotImplementedError(
-                'This SMBus implementation does not support this feature.'
-            ) from err
+        return self._call('write_block_data', addr, cmd, vals)
 
     def block_process_call(self, addr: int, cmd: int,
                            vals: List[int]) -> List[int]:
@@ -388,16 +902,41 @@ class I2CBus(object):
         sends 1 to 31 bytes of data to it, and reads 1 to 31 bytes
         of data in return.
         """
-        try:
-            return self.bus.block_process_call(addr, cmd, vals)
-        except OSError as err:
-            raise self._error(addr, err) from err
-        except AttributeError as err:
-            raise NotImplementedError(
-                'This SMBus implementation does not support this feature.'
-            ) from err
+        return self._call('block_process_call', addr, cmd, vals)
 
     # I2C Access
+    BLOCK_MAX = 32  # SMBus limit of block length
+    I2C_FUNC_I2C = 0x00000001  # Adapter functionality flag (linux/i2c.h)
+
+    def _supports_rdwr(self) -> bool:
+        """
+        True if backend and adapter support combined transactions
+        (I2C_RDWR). Adapter functionality is queried once per handle.
+        """
+        handle = self._handle
+        if handle is None:
+            return False
+        if handle.rdwr is None:
+            rdwr = (hasattr(handle.bus, 'transfer') or
+                    hasattr(handle.bus, 'i2c_rdwr'))
+            if rdwr:
+                try:
+                    funcs = getattr(handle.bus, 'funcs', None)
+                except OSError:
+                    funcs = None
+                if funcs is not None:
+                    rdwr = bool(funcs & self.I2C_FUNC_I2C)
+            handle.rdwr = rdwr
+        return handle.rdwr
+
+    @staticmethod
+    def _check_chunks(cmd: int, length: int) -> None:
+        """Check that block split into parts fits in registers (internal)."""
+        if cmd + length - 1 > 0xff:
+            raise ValueError(
+                'Block of {} bytes from register {} exceeds register 0xff, '
+                'backend does not support I2C_RDWR'.format(length, hex(cmd)))
+
     def read_i2c_block_data(self, addr: int, cmd: int,
                             len: int=32) -> List[int]:
         """
@@ -405,15 +944,55 @@ class I2CBus(object):
 
         This command reads a block of bytes from a device, from a
         designated register that is specified through the Comm byte.
+
+        Blocks longer than 32 bytes are read in a single combined
+        transaction if the backend supports it (I2C_RDWR), otherwise
+        in 32-byte parts from consecutive registers (up to register 0xff).
         """
-        try:
-            return self.bus.read_i2c_block_data(addr, cmd, len)
-        except OSError as err:
-            raise self._error(addr, err) from err
-        except AttributeError as err:
-            raise NotImplementedError(
-                'This SMBus implementation does not support this feature.'
-            ) from err
+        if len <= self.BLOCK_MAX:
+            return self._call('read_i2c_block_data', addr, cmd, len)
+        buffer = bytearray(len)
+        self.read_i2c_block_into(addr, cmd, buffer)
+        return list(buffer)
+
+    def read_i2c_block_into(self, addr: int, cmd: int, buffer) -> None:
+        """
+        Perform I2C Block Read transaction into a buffer.
+
+        Reads len(buffer) bytes into a writable bytes-like object
+        (bytearray, memoryview, array...) supplied by the caller,
+        so that data can be decoded with struct.unpack_from
+        without allocating new objects.
+        Long blocks are handled as in read_i2c_block_data.
+        """
+        view = memoryview(buffer).cast('B')
+        length = len(view)
+        if length > self.BLOCK_MAX:
+            if self._supports_rdwr():
+                self.transfer([I2CMessage.write(addr, [cmd]),
+                               I2CMessage(addr, I2CMessage.I2C_M_RD, view)])
+            else:
+                self._check_chunks(cmd, length)
+                for offset in range(0, length, self.BLOCK_MAX):
+                    self.read_i2c_block_into(
+                        addr, cmd + offset,
+                        view[offset:offset + self.BLOCK_MAX])
+            return None
+        if hasattr(self.bus, 'read_i2c_block_into'):
+            return self._call('read_i2c_block_into', addr, cmd, view)
+        view[:] = bytes(self._call('read_i2c_block_data',
+                                   addr, cmd, len(view)))
+
+    def read_i2c_block_bytes(self, addr: int, cmd: int,
+                             len: int=32) -> bytes:
+        """
+        Perform I2C Block Read transaction.
+
+        Same as read_i2c_block_data, but data is returned as bytes.
+        """
+        buffer = bytearray(len)
+        self.read_i2c_block_into(addr, cmd, buffer)
+        return bytes(buffer)
 
     def write_i2c_block_data(self, addr: int, cmd: int,
                              vals: List[int]) -> None:
@@ -424,12 +1003,112 @@ class I2CBus(object):
         a device, to a designated register that is specified through the
         Comm byte. Note that command lengths of 0, 2, or more bytes are
         supported as they are indistinguishable from data.
+
+        Blocks longer than 32 bytes are written in a single combined
+        transaction if the backend supports it (I2C_RDWR), otherwise
+        in 32-byte parts to consecutive registers (up to register 0xff).
         """
-        try:
-            return self.bus.write_i2c_block_data(addr, cmd, vals)
-        except OSError as err:
-            raise self._error(addr, err) from err
-        except AttributeError as err:
-            raise NotImplementedError(
-                'This SMBus implementation does not support this feature.'
-            ) from err
+        if self._cache:
+            # Registers after cmd are overwritten too (auto-increment)
+            for key in self._cache:
+                if key[0] == addr and key[1] is not None and \
+                        cmd < key[1] < cmd + len(vals):
+                    self._cache[key] = None
+        if len(vals) <= self.BLOCK_MAX:
+            return self._call('write_i2c_block_data', addr, cmd, vals)
+        if self._supports_rdwr():
+            self.transfer([I2CMessage.write(addr, bytes([cmd]) + bytes(vals))])
+            return None
+        self._check_chunks(cmd, len(vals))
+        for offset in range(0, len(vals), self.BLOCK_MAX):
+            self._call('write_i2c_block_data', addr, cmd + offset,
+                       list(vals[offset:offset + self.BLOCK_MAX]))
+        return None
+
+    # Combined transactions
+    def transfer(self, messages: List[I2CMessage]) -> List[List[int]]:
+        """
+        Perform combined I2C transaction (I2C_RDWR).
+
+        All messages are sent in a single transaction, with repeated
+        START conditions between them and a single STOP at the end.
+        Returns list of data received by read messages (in order);
+        their buffers are also filled in place.
+
+        Backends without I2C_RDWR support (python-smbus, Adafruit_PureIO)
+        only handle a single write, a single byte read, or a write
+        of the register number followed by a read from the same device,
+        which are mapped onto equivalent SMBus transactions.
+        """
+        messages = list(messages)
+        if not messages:
+            return []
+        if self._batch:
+            self._flush()
+        if self._cache:
+            # Written registers are not known, forget the whole device
+            for msg in messages:
+                if not msg.is_read:
+                    self.invalidate(msg.addr)
+        addr = messages[0].addr
+        handle = self._handle
+        if handle is None:
+            raise self._error(addr, OSError(EBADF, 'Bus closed'))
+        if hasattr(handle.bus, 'transfer'):
+            func = self._transfer_backend
+        elif hasattr(handle.bus, 'i2c_rdwr'):
+            func = self._transfer_rdwr
+        else:
+            func = self._transfer_smbus
+        self._perform(handle, lambda addr, messages: func(
+            handle.bus, messages), 'transfer', addr, (messages,))
+        return [list(msg.buf) for msg in messages if msg.is_read]
+
+    @staticmethod
+    def _transfer_backend(bus, messages: List[I2CMessage]) -> None:
+        """Perform combined transaction using backend (for internal use)."""
+        bus.transfer(messages)
+
+    @staticmethod
+    def _transfer_rdwr(bus, messages: List[I2CMessage]) -> None:
+        """Perform combined transaction using smbus2 (for internal use)."""
+        from smbus2 import i2c_msg
+        msgs = []
+        for msg in messages:
+            if msg.is_read:
+                msgs.append(i2c_msg.read(msg.addr, len(msg.buf)))
+            else:
+                msgs.append(i2c_msg.write(msg.addr, msg.buf))
+        bus.i2c_rdwr(*msgs)
+        for msg, result in zip(messages, msgs):
+            if msg.is_read:
+                msg.buf[:] = bytes(list(result))
+
+    @staticmethod
+    def _transfer_smbus(bus, messages: List[I2CMessage]) -> None:
+        """Emulate combined transaction with SMBus calls (for internal use)."""
+        unsupported = NotImplementedError(
+            'This SMBus implementation does not support '
+            'this combined transaction.')
+        if len(messages) == 1:
+            msg = messages[0]
+            if msg.is_read and len(msg.buf) == 1:
+                msg.buf[0] = bus.read_byte(msg.addr)
+            elif msg.is_read:
+                raise unsupported
+            elif len(msg.buf) == 1:
+                bus.write_byte(msg.addr, msg.buf[0])
+            elif msg.buf:
+                bus.write_i2c_block_data(msg.addr, msg.buf[0],
+                                         list(msg.buf[1:]))
+            else:
+                bus.write_quick(msg.addr)
+        elif len(messages) == 2:
+            wr, rd = messages
+            if (wr.is_read or not rd.is_read or wr.addr != rd.addr or
+                    len(wr.buf) != 1):
+                raise unsupported
+            rd.buf[:] = bytes(bus.read_i2c_block_data(
+                rd.addr, wr.buf[0], len(rd.buf)))
+        else:
+            raise unsupported
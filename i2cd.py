@@ -0,0 +1,518 @@
+"""
+This module defines a daemon owning I2C buses and serving I2CBus
+transactions to client processes over a Unix domain socket,
+and I2CProxy, an SMBus class forwarding transactions to the daemon:
+
+    $ sudo python3 i2cd.py --group i2c &
+
+    i2c.set_default_smbus(i2cd.proxy_smbus('/run/i2cd.sock'))
+    sensor = BME280(1)
+
+All access to a bus goes through one process, so it is serialized,
+instrumented (--stats) and scheduled in a single place.
+
+Clients can perform any transaction on the buses, so the socket
+is only accessible to the owner (normally root) and a group
+(mode 0660): run the daemon with --group i2c to serve users allowed
+to access /dev/i2c-* (the i2c group on Raspberry Pi OS). The default
+path in /run is only writable by root; an unprivileged daemon should
+use a path in its $XDG_RUNTIME_DIR (set I2CD_SOCKET for clients too).
+
+Protocol (little endian): request header - request id (I),
+operation (B), bus (h), address (B), register (H, 0xffff if none),
+payload length (H), followed by payload; response header - request id
+(I), errno (H, 0 on success), payload length (H), followed by payload.
+Integer arguments and results are sent as H, byte lists as raw bytes,
+read lengths as H, combined transactions as address (H), flags (H),
+length (H) and written data of each message (results: data read,
+concatenated). Operation stats returns statistics of the bus
+(see I2CStats.snapshot) as JSON, null if not collected.
+
+Clients may send several requests without waiting for responses
+(pipelining). The daemon executes all requests received together
+from one client bus by bus, holding the bus lock for each group.
+"""
+
+from errno import EINVAL, EIO, EMSGSIZE, ENOSYS
+from os import chmod, chown, environ, strerror, umask, unlink
+from socket import AF_UNIX, SOCK_STREAM, socket
+from struct import Struct, error as StructError, pack, unpack_from
+from threading import Lock, Thread
+try:
+    from typing import List
+except ImportError as err:
+    raise ImportError(
+        'Typing module must be manually installed on Python < 3.5') from err
+
+from i2c import I2CBus, I2CError, I2CMessage
+
+
+SOCKET_PATH = environ.get('I2CD_SOCKET', '/run/i2cd.sock')
+
+_REQUEST = Struct('<IBhBHH')
+_RESPONSE = Struct('<IHH')
+NO_REGISTER = 0xffff
+
+# Operation name: (has register, argument type, result type)
+# Types: '' - none, 'int' - 16-bit integer, 'bytes' - byte list,
+# 'len' - read length, 'msgs' - messages of combined transaction,
+# 'json' - JSON document
+OPERATIONS = [
+    ('write_quick', (False, '', '')),
+    ('read_byte', (False, '', 'int')),
+    ('write_byte', (False, 'int', '')),
+    ('read_byte_data', (True, '', 'int')),
+    ('write_byte_data', (True, 'int', '')),
+    ('read_word_data', (True, '', 'int')),
+    ('write_word_data', (True, 'int', '')),
+    ('process_call', (True, 'int', 'int')),
+    ('read_block_data', (True, '', 'bytes')),
+    ('write_block_data', (True, 'bytes', '')),
+    ('block_process_call', (True, 'bytes', 'bytes')),
+    ('read_i2c_block_data', (True, 'len', 'bytes')),
+    ('write_i2c_block_data', (True, 'bytes', '')),
+    ('transfer', (False, 'msgs', 'bytes')),
+    ('stats', (False, '', 'json')),
+]
+_CODES = {name: code for code, (name, _) in enumerate(OPERATIONS)}
+
+
+def _encode(kind: str, value) -> bytes:
+    if kind in ('int', 'len'):
+        return pack('<H', value & 0xffff)
+    if kind == 'bytes':
+        return bytes(value)
+    if kind == 'msgs':
+        return b''.join(pack('<HHH', msg.addr, msg.flags, len(msg.buf)) +
+                        (b'' if msg.is_read else bytes(msg.buf))
+                        for msg in value)
+    return b''
+
+
+def _decode_messages(data: bytes) -> List[I2CMessage]:
+    messages = []
+    offset = 0
+    while offset < len(data):
+        addr, flags, length = unpack_from('<HHH', data, offset)
+        offset += 6
+        if flags & I2CMessage.I2C_M_RD:
+            messages.append(I2CMessage(addr, flags, bytearray(length)))
+        else:
+            messages.append(I2CMessage(
+                addr, flags, bytearray(data[offset:offset + length])))
+            offset += length
+    return messages
+
+
+def _recv_exact(sock: socket, buffer: bytearray, length: int) -> bool:
+    """Receive exactly length bytes into buffer, False on end of stream."""
+    view = memoryview(buffer)[:length]
+    received = 0
+    while received < length:
+        count = sock.recv_into(view[received:])
+        if not count:
+            return False
+        received += count
+    return True
+
+
+class I2CDaemon(object):
+
+    """
+    Server executing transactions of clients connected
+    to the Unix domain socket (one thread per client).
+
+    The socket is created with permissions mode, owned by group
+    (name or id, None keeps the group of the process).
+    Other keyword arguments (e.g. smbus) are passed to I2CBus.
+    """
+
+    def __init__(self, path: str=SOCKET_PATH, stats: bool=False,
+                 mode: int=0o660, group=None, **kwargs) -> None:
+        self.path = path
+        self.mode = mode
+        self.group = group
+        self._stats = stats
+        self._kwargs = kwargs
+        self._buses = {}
+        self._buses_lock = Lock()
+        self._socket = None
+        self._running = False
+
+    def bus(self, number: int) -> I2CBus:
+        """Return (and open if needed) I2CBus object of the bus."""
+        with self._buses_lock:
+            bus = self._buses.get(number)
+            if bus is None:
+                bus = self._buses[number] = I2CBus(number, **self._kwargs)
+                if self._stats:
+                    bus.enable_stats()
+            return bus
+
+    def stats(self) -> dict:
+        """Return {bus: statistics snapshot} (see I2CStats.snapshot)."""
+        with self._buses_lock:
+            buses = list(self._buses.items())
+        return {number: bus.stats.snapshot() for number, bus in buses
+                if bus.stats is not None}
+
+    def serve_forever(self) -> None:
+        """Listen on the socket and serve clients until shutdown()."""
+        try:
+            unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self._socket = socket(AF_UNIX, SOCK_STREAM)
+        # Not accessible to others until permissions are set
+        mask = umask(0o177)
+        try:
+            self._socket.bind(self.path)
+        finally:
+            umask(mask)
+        if self.group is not None:
+            group = self.group
+            if isinstance(group, str):
+                from grp import getgrnam
+                group = getgrnam(group).gr_gid
+            chown(self.path, -1, group)
+        chmod(self.path, self.mode)
+        self._socket.listen()
+        self._running = True
+        try:
+            while self._running:
+                try:
+                    client, _ = self._socket.accept()
+                except OSError:
+                    break
+                Thread(target=self._serve, args=(client,),
+                       daemon=True).start()
+        finally:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        """Stop accepting clients and close all buses."""
+        self._running = False
+        sock, self._socket = self._socket, None
+        if sock is not None:
+            sock.close()
+            try:
+                unlink(self.path)
+            except FileNotFoundError:
+                pass
+        with self._buses_lock:
+            buses, self._buses = self._buses, {}
+        for bus in buses.values():
+            bus.close()
+
+    def _serve(self, client: socket) -> None:
+        """Serve requests of a single client (in its own thread)."""
+        pending = bytearray()
+        with client:
+            while True:
+                try:
+                    data = client.recv(65536)
+                except OSError:
+                    return
+                if not data:
+                    return
+                pending += data
+                requests, used = self._parse(pending)
+                del pending[:used]
+                if requests:
+                    try:
+                        client.sendall(self._execute(requests))
+                    except OSError:
+                        return  # client disconnected
+
+    @staticmethod
+    def _parse(data: bytearray) -> (list, int):
+        """Split complete requests off the data, return them and size."""
+        requests = []
+        offset = 0
+        while len(data) - offset >= _REQUEST.size:
+            header = _REQUEST.unpack_from(data, offset)
+            end = offset + _REQUEST.size + header[5]
+            if end > len(data):
+                break
+            requests.append(header[:5] +
+                            (bytes(data[offset + _REQUEST.size:end]),))
+            offset = end
+        return requests, offset
+
+    def _execute(self, requests: list) -> bytes:
+        """Execute requests grouped by bus, return encoded responses."""
+        groups = {}
+        for request in requests:
+            groups.setdefault(request[2], []).append(request)
+        responses = []
+        for number, group in groups.items():
+            try:
+                bus = self.bus(number)
+            except OSError as err:
+                for request in group:
+                    responses.append(_RESPONSE.pack(
+                        request[0], err.errno or EIO, 0))
+                continue
+            with bus.exclusive():
+                for request in group:
+                    responses.append(self._perform(bus, *request))
+        return b''.join(responses)
+
+    @staticmethod
+    def _perform(bus: I2CBus, ident: int, code: int, number: int,
+                 addr: int, cmd: int, payload: bytes) -> bytes:
+        """Perform single request, return encoded response."""
+        try:
+            name, (has_cmd, arg_kind, result_kind) = OPERATIONS[code]
+            args = (cmd,) if has_cmd else ()
+            if arg_kind in ('int', 'len'):
+                args += unpack_from('<H', payload)
+            elif arg_kind == 'bytes':
+                args += (list(payload),)
+            if arg_kind == 'msgs':
+                messages = _decode_messages(payload)
+                bus.transfer(messages)
+                result = b''.join(bytes(msg.buf) for msg in messages
+                                  if msg.is_read)
+            elif name == 'stats':
+                from json import dumps
+                stats = bus.stats
+                result = dumps(stats.snapshot() if stats is not None
+                               else None, separators=(',', ':')).encode()
+            else:
+                result = _encode(result_kind, getattr(bus, name)(addr, *args))
+        except OSError as err:
+            return _RESPONSE.pack(ident, err.errno or EIO, 0)
+        except NotImplementedError:
+            return _RESPONSE.pack(ident, ENOSYS, 0)
+        except (ValueError, TypeError, IndexError, StructError):
+            return _RESPONSE.pack(ident, EINVAL, 0)
+        if len(result) > 0xffff:
+            return _RESPONSE.pack(ident, EMSGSIZE, 0)
+        return _RESPONSE.pack(ident, 0, len(result)) + result
+
+
+class I2CProxy(object):
+
+    """
+    SMBus object forwarding transactions to the daemon.
+
+    With pipeline=True, writes return without waiting for a response;
+    pending responses are collected by the next read (or sync()),
+    which raises the first error of them (as I2CError naming
+    the address of the failed write).
+
+    Use proxy_smbus() to create a class bound to a socket path.
+    """
+
+    path = SOCKET_PATH
+    pipeline = False
+
+    def __init__(self, bus: int=None) -> None:
+        self._socket = None
+        self._lock = Lock()
+        self._ident = 0
+        self._pending = 0
+        self._sent = {}  # request id: address, of pending requests
+        self._error = None  # (request id, address, errno) of first error
+        self._header = bytearray(_RESPONSE.size)
+        self._data = bytearray(65535)
+        if bus is not None:
+            self.open(bus)
+
+    def open(self, bus: int) -> None:
+        """Connect to the daemon, using the specified bus."""
+        self.close()
+        self.bus = bus
+        self._socket = socket(AF_UNIX, SOCK_STREAM)
+        try:
+            self._socket.connect(self.path)
+        except OSError:
+            self._socket.close()
+            self._socket = None
+            raise
+
+    def close(self) -> None:
+        """Disconnect from the daemon."""
+        sock, self._socket = self._socket, None
+        if sock is not None:
+            try:
+                self.sync()
+            except OSError:
+                pass
+            sock.close()
+
+    def sync(self) -> None:
+        """Wait for responses to pipelined writes, raise their error."""
+        with self._lock:
+            self._drain()
+
+    def _drain(self, current: int=None) -> None:
+        """
+        Receive pending responses, raise the first error of them
+        (OSError if it is the error of request current).
+        """
+        while self._pending:
+            self._receive()
+        error, self._error = self._error, None
+        if error is not None:
+            ident, addr, errno = error
+            if ident == current:
+                raise OSError(errno, strerror(errno))
+            err = I2CError(errno, 'Error accessing address {}: {} '
+                           '(pipelined write)'.format(hex(addr),
+                                                      strerror(errno)))
+            err.addr = addr  # failed device (see I2CBus circuit breaker)
+            raise err
+
+    def _receive(self) -> bytes:
+        """Receive next response, return its payload."""
+        if not _recv_exact(self._socket, self._header, _RESPONSE.size):
+            raise OSError(EIO, 'Connection to I2C daemon closed')
+        ident, errno, length = _RESPONSE.unpack_from(self._header)
+        if length and not _recv_exact(self._socket, self._data, length):
+            raise OSError(EIO, 'Connection to I2C daemon closed')
+        self._pending -= 1
+        addr = self._sent.pop(ident, None)
+        if errno:
+            if self._error is None:
+                self._error = (ident, addr, errno)
+            return None
+        return bytes(self._data[:length])
+
+    def _request(self, name: str, addr: int, cmd: int=None, value=None):
+        """Send request, return decoded result (for internal use)."""
+        if self._socket is None:
+            raise OSError(EIO, 'Not connected to I2C daemon')
+        code = _CODES[name]
+        has_cmd, arg_kind, result_kind = OPERATIONS[code][1]
+        payload = _encode(arg_kind, value)
+        with self._lock:
+            self._ident = (self._ident + 1) & 0xffffffff
+            self._socket.sendall(_REQUEST.pack(
+                self._ident, code, self.bus, addr,
+                NO_REGISTER if cmd is None else cmd,
+                len(payload)) + payload)
+            self._pending += 1
+            self._sent[self._ident] = addr
+            if self.pipeline and not result_kind:
+                return None
+            while self._pending > 1:
+                self._receive()
+            result = self._receive()
+            self._drain(self._ident)
+        if result_kind == 'int':
+            return unpack_from('<H', result)[0]
+        if result_kind in ('bytes', 'json'):
+            return result
+        return None
+
+    # SMBus Access
+    def write_quick(self, addr: int) -> None:
+        self._request('write_quick', addr)
+
+    def read_byte(self, addr: int) -> int:
+        return self._request('read_byte', addr)
+
+    def write_byte(self, addr: int, val: int) -> None:
+        self._request('write_byte', addr, None, val)
+
+    def read_byte_data(self, addr: int, cmd: int) -> int:
+        return self._request('read_byte_data', addr, cmd)
+
+    def write_byte_data(self, addr: int, cmd: int, val: int) -> None:
+        self._request('write_byte_data', addr, cmd, val)
+
+    def read_word_data(self, addr: int, cmd: int) -> int:
+        return self._request('read_word_data', addr, cmd)
+
+    def write_word_data(self, addr: int, cmd: int, val: int) -> None:
+        self._request('write_word_data', addr, cmd, val)
+
+    def process_call(self, addr: int, cmd: int, val: int) -> int:
+        return self._request('process_call', addr, cmd, val)
+
+    def read_block_data(self, addr: int, cmd: int) -> List[int]:
+        return list(self._request('read_block_data', addr, cmd))
+
+    def write_block_data(self, addr: int, cmd: int, vals: List[int]) -> None:
+        self._request('write_block_data', addr, cmd, vals)
+
+    def block_process_call(self, addr: int, cmd: int,
+                           vals: List[int]) -> List[int]:
+        return list(self._request('block_process_call', addr, cmd, vals))
+
+    # I2C Access
+    def read_i2c_block_data(self, addr: int, cmd: int,
+                            len: int=32) -> List[int]:
+        return list(self._request('read_i2c_block_data', addr, cmd, len))
+
+    def read_i2c_block_into(self, addr: int, cmd: int, buffer) -> None:
+        view = memoryview(buffer).cast('B')
+        view[:] = self._request('read_i2c_block_data', addr, cmd, len(view))
+
+    def write_i2c_block_data(self, addr: int, cmd: int,
+                             vals: List[int]) -> None:
+        self._request('write_i2c_block_data', addr, cmd, vals)
+
+    # Daemon
+    def stats(self) -> dict:
+        """
+        Return statistics of the bus collected by the daemon (see
+        I2CStats.snapshot), or None if it does not collect them.
+        """
+        from json import loads
+        stats = loads(self._request('stats', 0).decode())
+        if stats is None:
+            return None
+        return {int(addr): {name: dict(entry, errors={
+                    int(errno): count
+                    for errno, count in entry['errors'].items()})
+                    for name, entry in operations.items()}
+                for addr, operations in stats.items()}
+
+    # Combined transactions
+    def transfer(self, messages: List[I2CMessage]) -> None:
+        data = self._request('transfer', messages[0].addr, None, messages)
+        offset = 0
+        for msg in messages:
+            if msg.is_read:
+                msg.buf[:] = data[offset:offset + len(msg.buf)]
+                offset += len(msg.buf)
+
+
+def proxy_smbus(path: str=SOCKET_PATH, pipeline: bool=False):
+    """Create I2CProxy class connecting to the specified socket."""
+    return type('I2CProxy', (I2CProxy,),
+                {'path': path, 'pipeline': pipeline})
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+    parser = ArgumentParser(description='Serve I2C buses over Unix socket.')
+    parser.add_argument('--socket', default=SOCKET_PATH,
+                        help='socket path (default: %(default)s)')
+    parser.add_argument('--group',
+                        help='group allowed to use the socket '
+                        '(default: group of the daemon)')
+    parser.add_argument('--mode', default='660', type=lambda s: int(s, 8),
+                        help='permissions of the socket (octal, '
+                        'default: %(default)s)')
+    parser.add_argument('--stats', action='store_true',
+                        help='collect transaction statistics')
+    parser.add_argument('--print-stats', metavar='BUS', type=int,
+                        help='print statistics of the bus collected by '
+                        'a running daemon and exit')
+    options = parser.parse_args()
+    if options.print_stats is not None:
+        from json import dumps
+        proxy = proxy_smbus(options.socket)(options.print_stats)
+        print(dumps(proxy.stats(), indent=2, sort_keys=True))
+        proxy.close()
+        raise SystemExit(0)
+    daemon = I2CDaemon(options.socket, stats=options.stats,
+                       mode=options.mode, group=options.group)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
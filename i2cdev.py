@@ -0,0 +1,261 @@
+"""
+This module defines an SMBus implementation talking directly to
+the Linux I2C device interface (/dev/i2c-N) through ioctl calls,
+without any external dependencies.
+
+Transaction buffers are allocated once per object and reused,
+and the I2C_SLAVE ioctl is only issued when the target address changes.
+
+It can be used by I2CBus through the smbus parameter:
+    I2CBus(1, smbus=I2CDev)
+"""
+
+
+# Kernel interface documentation:
+# https://git.kernel.org/cgit/linux/kernel/git/torvalds/
+#     linux.git/plain/Documentation/i2c/dev-interface
+
+
+import os
+from ctypes import (POINTER, Structure, Union, addressof, c_uint8, c_uint16,
+                    c_uint32, cast, pointer)
+from fcntl import ioctl
+try:
+    from typing import List
+except ImportError as err:
+    raise ImportError(
+        'Typing module must be manually installed on Python < 3.5') from err
+
+
+# ioctl commands (linux/i2c-dev.h)
+I2C_SLAVE = 0x0703
+I2C_SLAVE_FORCE = 0x0706
+I2C_FUNCS = 0x0705
+I2C_RDWR = 0x0707
+I2C_PEC = 0x0708
+I2C_SMBUS = 0x0720
+
+# SMBus transfer direction and size (linux/i2c.h)
+I2C_SMBUS_WRITE = 0
+I2C_SMBUS_READ = 1
+
+I2C_SMBUS_QUICK = 0
+I2C_SMBUS_BYTE = 1
+I2C_SMBUS_BYTE_DATA = 2
+I2C_SMBUS_WORD_DATA = 3
+I2C_SMBUS_PROC_CALL = 4
+I2C_SMBUS_BLOCK_DATA = 5
+I2C_SMBUS_BLOCK_PROC_CALL = 7
+I2C_SMBUS_I2C_BLOCK_DATA = 8
+
+I2C_SMBUS_BLOCK_MAX = 32
+
+
+class i2c_smbus_data(Union):
+    _fields_ = [('byte', c_uint8),
+                ('word', c_uint16),
+                ('block', c_uint8 * (I2C_SMBUS_BLOCK_MAX + 2))]
+
+
+class i2c_smbus_ioctl_data(Structure):
+    _fields_ = [('read_write', c_uint8),
+                ('command', c_uint8),
+                ('size', c_uint32),
+                ('data', POINTER(i2c_smbus_data))]
+
+
+class i2c_msg(Structure):
+    _fields_ = [('addr', c_uint16),
+                ('flags', c_uint16),
+                ('len', c_uint16),
+                ('buf', POINTER(c_uint8))]
+
+
+class i2c_rdwr_ioctl_data(Structure):
+    _fields_ = [('msgs', POINTER(i2c_msg)),
+                ('nmsgs', c_uint32)]
+
+
+class I2CDev(object):
+
+    """
+    SMBus object using the I2C device interface directly.
+
+    Method set is the same as in smbus/smbus2 SMBus classes,
+    with additional transfer() for combined (I2C_RDWR) transactions.
+    """
+
+    def __init__(self, bus: int=None, force: bool=False) -> None:
+        self.fd = None
+        self.force = force
+        self._addr = None
+        self._pec = False
+        self._data = i2c_smbus_data()
+        self._args = i2c_smbus_ioctl_data(
+            read_write=0, command=0, size=0, data=pointer(self._data))
+        self._block = memoryview(self._data.block).cast('B')
+        if bus is not None:
+            self.open(bus)
+
+    def __del__(self):
+        self.close()
+
+    def open(self, bus: int) -> None:
+        """Open /dev/i2c-<bus>."""
+        self.close()
+        self.fd = os.open('/dev/i2c-{}'.format(bus), os.O_RDWR)
+
+    def close(self) -> None:
+        """Close the device file."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+            self._addr = None
+
+    def fileno(self) -> int:
+        return self.fd
+
+    @property
+    def pec(self) -> bool:
+        return self._pec
+
+    @pec.setter
+    def pec(self, val) -> None:
+        ioctl(self._fd(), I2C_PEC, int(bool(val)))
+        self._pec = bool(val)
+
+    @property
+    def funcs(self) -> int:
+        """Adapter functionality mask (I2C_FUNCS)."""
+        buf = c_uint32()
+        ioctl(self._fd(), I2C_FUNCS, buf)
+        return buf.value
+
+    def _fd(self) -> int:
+        if self.fd is None:
+            raise OSError(9, 'Bad file descriptor')
+        return self.fd
+
+    def _set_addr(self, addr: int) -> int:
+        """Select target device, if different from the last one."""
+        fd = self._fd()
+        if addr != self._addr:
+            ioctl(fd, I2C_SLAVE_FORCE if self.force else I2C_SLAVE, addr)
+            self._addr = addr
+        return fd
+
+    def _smbus(self, addr: int, read_write: int, cmd: int, size: int):
+        """Perform I2C_SMBUS ioctl using the preallocated buffer."""
+        fd = self._set_addr(addr)
+        args = self._args
+        args.read_write = read_write
+        args.command = cmd
+        args.size = size
+        ioctl(fd, I2C_SMBUS, args)
+        return self._data
+
+    def _set_block(self, vals) -> None:
+        """Copy vals (with length byte) into the data block."""
+        length = len(vals)
+        if length > I2C_SMBUS_BLOCK_MAX:
+            raise ValueError('Data length cannot exceed {} bytes'.format(
+                I2C_SMBUS_BLOCK_MAX))
+        block = self._data.block
+        block[0] = length
+        block[1:length + 1] = vals
+
+    # SMBus Access
+    def write_quick(self, addr: int) -> None:
+        self._smbus(addr, I2C_SMBUS_WRITE, 0, I2C_SMBUS_QUICK)
+
+    def read_byte(self, addr: int) -> int:
+        return self._smbus(addr, I2C_SMBUS_READ, 0, I2C_SMBUS_BYTE).byte
+
+    def write_byte(self, addr: int, val: int) -> None:
+        self._smbus(addr, I2C_SMBUS_WRITE, val, I2C_SMBUS_BYTE)
+
+    def read_byte_data(self, addr: int, cmd: int) -> int:
+        return self._smbus(addr, I2C_SMBUS_READ, cmd,
+                           I2C_SMBUS_BYTE_DATA).byte
+
+    def write_byte_data(self, addr: int, cmd: int, val: int) -> None:
+        self._data.byte = val
+        self._smbus(addr, I2C_SMBUS_WRITE, cmd, I2C_SMBUS_BYTE_DATA)
+
+    def read_word_data(self, addr: int, cmd: int) -> int:
+        return self._smbus(addr, I2C_SMBUS_READ, cmd,
+                           I2C_SMBUS_WORD_DATA).word
+
+    def write_word_data(self, addr: int, cmd: int, val: int) -> None:
+        self._data.word = val
+        self._smbus(addr, I2C_SMBUS_WRITE, cmd, I2C_SMBUS_WORD_DATA)
+
+    def process_call(self, addr: int, cmd: int, val: int) -> int:
+        self._data.word = val
+        return self._smbus(addr, I2C_SMBUS_WRITE, cmd,
+                           I2C_SMBUS_PROC_CALL).word
+
+    def read_block_data(self, addr: int, cmd: int) -> List[int]:
+        block = self._smbus(addr, I2C_SMBUS_READ, cmd,
+                            I2C_SMBUS_BLOCK_DATA).block
+        return block[1:block[0] + 1]
+
+    def write_block_data(self, addr: int, cmd: int, vals: List[int]) -> None:
+        self._set_block(vals)
+        self._smbus(addr, I2C_SMBUS_WRITE, cmd, I2C_SMBUS_BLOCK_DATA)
+
+    def block_process_call(self, addr: int, cmd: int,
+                           vals: List[int]) -> List[int]:
+        self._set_block(vals)
+        block = self._smbus(addr, I2C_SMBUS_WRITE, cmd,
+                            I2C_SMBUS_BLOCK_PROC_CALL).block
+        return block[1:block[0] + 1]
+
+    # I2C Access
+    def read_i2c_block_data(self, addr: int, cmd: int,
+                            len: int=32) -> List[int]:
+        if len > I2C_SMBUS_BLOCK_MAX:
+            raise ValueError('Data length cannot exceed {} bytes'.format(
+                I2C_SMBUS_BLOCK_MAX))
+        self._data.block[0] = len
+        block = self._smbus(addr, I2C_SMBUS_READ, cmd,
+                            I2C_SMBUS_I2C_BLOCK_DATA).block
+        return block[1:block[0] + 1]
+
+    def read_i2c_block_into(self, addr: int, cmd: int, buffer) -> None:
+        """Read len(buffer) bytes into a writable bytes-like object."""
+        view = memoryview(buffer).cast('B')
+        length = len(view)
+        if length > I2C_SMBUS_BLOCK_MAX:
+            raise ValueError('Data length cannot exceed {} bytes'.format(
+                I2C_SMBUS_BLOCK_MAX))
+        self._data.block[0] = length
+        self._smbus(addr, I2C_SMBUS_READ, cmd, I2C_SMBUS_I2C_BLOCK_DATA)
+        view[:] = self._block[1:length + 1]
+
+    def write_i2c_block_data(self, addr: int, cmd: int,
+                             vals: List[int]) -> None:
+        self._set_block(vals)
+        self._smbus(addr, I2C_SMBUS_WRITE, cmd, I2C_SMBUS_I2C_BLOCK_DATA)
+
+    # Combined transactions
+    def transfer(self, messages) -> None:
+        """
+        Perform combined transaction (I2C_RDWR).
+
+        Messages are I2CMessage objects (or anything with addr, flags and
+        a writable buf); read messages have their buffers filled in place.
+        """
+        fd = self._fd()
+        count = len(messages)
+        msgs = (i2c_msg * count)()
+        buffers = []
+        for msg, raw in zip(messages, msgs):
+            buf = (c_uint8 * len(msg.buf)).from_buffer(msg.buf)
+            buffers.append(buf)
+            raw.addr = msg.addr
+            raw.flags = msg.flags
+            raw.len = len(msg.buf)
+            raw.buf = cast(addressof(buf), POINTER(c_uint8))
+        ioctl(fd, I2C_RDWR, i2c_rdwr_ioctl_data(msgs=msgs, nmsgs=count))
+        del buffers
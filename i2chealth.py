@@ -0,0 +1,87 @@
+"""
+This module defines health tracking of devices used by I2CBus
+(see I2CBus.enable_breaker).
+
+A device failing repeatedly is cut off (circuit breaker), so polling
+it does not delay transactions with healthy devices on the same bus
+by kernel timeouts, and it is re-probed with exponential backoff.
+"""
+
+from threading import Lock
+from time import monotonic
+
+
+class CircuitBreaker(object):
+
+    """
+    Health state of devices on one bus.
+
+    After threshold consecutive failed transactions with an address,
+    further transactions fail immediately (circuit open), except for
+    a single probe transaction allowed after backoff seconds.
+    Backoff doubles after each failed probe (up to max_backoff),
+    a successful transaction closes the circuit again.
+    """
+
+    def __init__(self, threshold: int=3, backoff: float=1.0,
+                 max_backoff: float=60.0) -> None:
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = Lock()
+        self._state = {}  # address: [failures, retry time, backoff]
+
+    def allow(self, addr: int) -> bool:
+        """Return True if transaction with address may be attempted."""
+        state = self._state.get(addr)
+        if state is None or state[0] < self.threshold:
+            return True
+        with self._lock:
+            now = monotonic()
+            if now < state[1]:
+                return False
+            # Let this transaction probe the device, others keep failing
+            # fast until it finishes
+            state[1] = now + state[2]
+            return True
+
+    def success(self, addr: int) -> None:
+        """Record successful transaction with address."""
+        if addr in self._state:
+            with self._lock:
+                self._state.pop(addr, None)
+
+    def failure(self, addr: int) -> None:
+        """Record failed transaction with address."""
+        with self._lock:
+            state = self._state.get(addr)
+            if state is None:
+                state = self._state[addr] = [0, 0.0, self.backoff]
+            state[0] += 1
+            if state[0] >= self.threshold:
+                if state[0] > self.threshold:
+                    state[2] = min(state[2] * 2, self.max_backoff)
+                state[1] = monotonic() + state[2]
+
+    def snapshot(self) -> dict:
+        """
+        Return state of failing devices as
+        {address: {'failures', 'open', 'retry_in'}}
+        (retry_in in seconds, 0 if a probe is allowed now).
+        """
+        now = monotonic()
+        with self._lock:
+            return {addr: {
+                'failures': failures,
+                'open': failures >= self.threshold,
+                'retry_in': max(retry - now, 0.0)
+                if failures >= self.threshold else 0.0,
+            } for addr, (failures, retry, _) in self._state.items()}
+
+    def reset(self, addr: int=None) -> None:
+        """Forget failures of the address (or of all addresses)."""
+        with self._lock:
+            if addr is None:
+                self._state = {}
+            else:
+                self._state.pop(addr, None)
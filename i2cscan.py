@@ -0,0 +1,162 @@
+"""
+This module defines a scanner of I2C buses, detecting responding
+devices and identifying them by probing known ID registers.
+
+    >>> scan()
+    {1: {0x27: PCF8574, 0x40: INA219, 0x76: BME280, 0x70: HT16K33}}
+
+Buses are scanned in parallel (one thread per bus).
+Devices without ID registers are identified by address only,
+so they are only a guess (None means unknown device).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+try:
+    from typing import Dict, Iterable, List
+except ImportError as err:
+    raise ImportError(
+        'Typing module must be manually installed on Python < 3.5') from err
+
+from i2c import I2CBus, I2CError
+from am2315 import AM2315
+from bme280 import BME280
+from bmp280 import BMP280
+from ht16k33 import HT16K33
+from ina219 import INA219
+from pcf8574 import PCF8574
+from sn3218 import SN3218
+from tsl2561 import TSL2561
+
+
+# Default range of scanned addresses (same as i2cdetect)
+ADDRESSES = range(0x03, 0x78)
+
+
+def _probe_bmp280(bus: I2CBus, addr: int):
+    chip_id = bus.read_byte_data(addr, BMP280.ID)
+    if chip_id in (0x56, 0x57, 0x58):
+        return BMP280
+    if chip_id == 0x60:
+        return BME280
+    return None
+
+
+def _probe_tsl2561(bus: I2CBus, addr: int):
+    data = bus.read_byte_data(addr, TSL2561.CMD | TSL2561.ID)
+    if (data >> 4) in (0x1, 0x4, 0x5):
+        return TSL2561
+    return None
+
+
+def _probe_ina219(bus: I2CBus, addr: int):
+    # Configuration register holds default value after power-on
+    config = bus.read_word_swapped(addr, INA219.CONFIG)
+    if config == 0x399f:
+        return INA219
+    return None
+
+
+def _guess(cls):
+    """Create probe identifying device by address only."""
+    return lambda bus, addr: cls
+
+
+# (addresses, probe function), in order of probing;
+# probes return driver class or None if not identified.
+PROBES = [
+    ((0x76, 0x77), _probe_bmp280),
+    ((0x29, 0x39, 0x49), _probe_tsl2561),
+    (range(0x40, 0x50), _probe_ina219),
+    ((AM2315.I2C_ADDRESS,), _guess(AM2315)),
+    ((SN3218.I2C_ADDRESS,), _guess(SN3218)),
+    (tuple(range(0x20, 0x28)) + tuple(range(0x38, 0x40)), _guess(PCF8574)),
+    (range(0x70, 0x78), _guess(HT16K33)),
+]
+
+
+def buses() -> List[int]:
+    """Return numbers of I2C buses present in the system."""
+    numbers = []
+    for path in glob('/dev/i2c-*'):
+        try:
+            numbers.append(int(path[len('/dev/i2c-'):]))
+        except ValueError:
+            pass
+    return sorted(numbers)
+
+
+# Write-only devices in the range scanned with reads
+WRITE_ONLY = (SN3218.I2C_ADDRESS,)
+
+
+def _responds(bus: I2CBus, addr: int) -> bool:
+    """Check if device acknowledges its address (like i2cdetect)."""
+    try:
+        # Quick write can corrupt some EEPROMs, use read there
+        if 0x30 <= addr <= 0x37 or 0x50 <= addr <= 0x5f:
+            try:
+                bus.read_byte(addr)
+            except I2CError:
+                if addr not in WRITE_ONLY:
+                    raise
+                bus.write_quick(addr)
+        else:
+            try:
+                bus.write_quick(addr)
+            except NotImplementedError:
+                bus.read_byte(addr)
+    except I2CError:
+        return False
+    return True
+
+
+def identify(bus: I2CBus, addr: int):
+    """Return driver class for device at address, or None if unknown."""
+    for addresses, probe in PROBES:
+        if addr not in addresses:
+            continue
+        try:
+            cls = probe(bus, addr)
+        except I2CError:
+            cls = None
+        if cls is not None:
+            return cls
+    return None
+
+
+def scan_bus(bus: int, addresses: Iterable[int]=ADDRESSES,
+             probe: bool=True, **kwargs) -> Dict[int, type]:
+    """
+    Scan single bus, return {address: driver class or None}
+    for all responding devices.
+
+    Other keyword arguments are passed to I2CBus.
+    """
+    found = {}
+    with I2CBus(bus, **kwargs) as i2c:
+        for addr in addresses:
+            if _responds(i2c, addr):
+                found[addr] = identify(i2c, addr) if probe else None
+    return found
+
+
+def scan(bus_numbers: Iterable[int]=None, addresses: Iterable[int]=ADDRESSES,
+         probe: bool=True, **kwargs) -> Dict[int, Dict[int, type]]:
+    """
+    Scan buses in parallel, return {bus: {address: driver class or None}}.
+
+    By default all buses present in the system are scanned.
+    Other keyword arguments are passed to I2CBus.
+    """
+    if bus_numbers is None:
+        bus_numbers = buses()
+    bus_numbers = list(bus_numbers)
+    addresses = list(addresses)
+    if not bus_numbers:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(bus_numbers)) as executor:
+        results = executor.map(
+            lambda bus: scan_bus(bus, addresses, probe, **kwargs),
+            bus_numbers)
+        return dict(zip(bus_numbers, results))
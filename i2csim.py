@@ -0,0 +1,482 @@
+"""
+This module defines a simulated SMBus, with register-map models
+of the devices supported by this collection, for testing and
+benchmarking drivers without I2C hardware.
+
+Simulated buses are global and identified by number, just like the real
+ones. Attach device models to a bus, then select the simulated SMBus:
+
+    sim = i2csim.bus(1)
+    sim.attach(0x77, i2csim.BMP280Sim())
+    i2c.set_default_smbus(i2csim.SimulatedSMBus)
+    sensor = BMP280(1)
+    sensor.temperature()
+    sim.transactions  # number of transactions so far
+
+Each simulated transaction takes time according to a simple model:
+overhead + 9 bits per byte (address byte included) / clock_hz.
+Latency is disabled by default (clock_hz=None).
+"""
+
+from errno import EIO
+from struct import pack, pack_into, unpack_from
+from threading import Lock
+from time import perf_counter, sleep
+try:
+    from typing import List
+except ImportError as err:
+    raise ImportError(
+        'Typing module must be manually installed on Python < 3.5') from err
+
+
+class SimulatedDevice(object):
+
+    """
+    Generic I2C device with 256 8-bit registers.
+
+    First byte of a write selects the register, following bytes are
+    written to consecutive registers. Reads return consecutive
+    registers, starting with the selected one.
+    Subclasses change this behaviour by overriding write() and read().
+    """
+
+    def __init__(self, registers: dict=None) -> None:
+        self.regs = bytearray(256)
+        self.pointer = 0
+        for reg, val in (registers or {}).items():
+            self.regs[reg] = val
+
+    def write(self, data: bytes) -> None:
+        """Handle raw I2C write."""
+        if not data:
+            return
+        self.pointer = data[0]
+        for val in data[1:]:
+            self.write_register(self.pointer, val)
+            self.pointer = (self.pointer + 1) & 0xff
+
+    def read(self, length: int) -> bytes:
+        """Handle raw I2C read."""
+        data = bytearray(length)
+        for i in range(length):
+            data[i] = self.read_register(self.pointer)
+            self.pointer = (self.pointer + 1) & 0xff
+        return bytes(data)
+
+    def write_register(self, reg: int, val: int) -> None:
+        self.regs[reg] = val
+
+    def read_register(self, reg: int) -> int:
+        return self.regs[reg]
+
+
+class BMP280Sim(SimulatedDevice):
+
+    """
+    BMP280 model with calibration and measurement example
+    from the datasheet (25.08 degC, 100653.27 Pa).
+    """
+
+    CHIP_ID = 0x58
+    CALIBRATION = (27504, 26435, -1000,
+                   36477, -10685, 3024, 2855, 140, -7, 15500, -14600, 6000)
+
+    def __init__(self, adc_T: int=519888, adc_P: int=415148) -> None:
+        super().__init__()
+        self.reset()
+        self.set_raw(adc_T, adc_P)
+
+    def reset(self) -> None:
+        """Reset to power-on state (calibration is kept)."""
+        self.regs[0xd0] = self.CHIP_ID
+        pack_into('<HhhHhhhhhhhh', self.regs, 0x88, *self.CALIBRATION)
+        self.regs[0xf3:0xf6] = bytes(3)
+
+    def set_raw(self, adc_T: int, adc_P: int) -> None:
+        """Set raw 20-bit temperature and pressure values."""
+        for reg, val in ((0xf7, adc_P), (0xfa, adc_T)):
+            self.regs[reg:reg + 3] = bytes(
+                [(val >> 12) & 0xff, (val >> 4) & 0xff, (val << 4) & 0xf0])
+
+    def write_register(self, reg: int, val: int) -> None:
+        if reg == 0xe0:
+            if val == 0xb6:
+                self.reset()
+        elif reg in (0xf2, 0xf4, 0xf5):
+            self.regs[reg] = val
+
+
+class BME280Sim(BMP280Sim):
+
+    """BME280 model, adding typical humidity calibration."""
+
+    CHIP_ID = 0x60
+    CALIBRATION_H = (75, 362, 0, 313, 50, 30)
+
+    def __init__(self, adc_T: int=519888, adc_P: int=415148,
+                 adc_H: int=30000) -> None:
+        super().__init__(adc_T, adc_P)
+        self.set_raw_humidity(adc_H)
+
+    def reset(self) -> None:
+        super().reset()
+        h1, h2, h3, h4, h5, h6 = self.CALIBRATION_H
+        self.regs[0xa1] = h1
+        pack_into('<hB', self.regs, 0xe1, h2, h3)
+        self.regs[0xe4] = (h4 >> 4) & 0xff
+        self.regs[0xe5] = (h4 & 0x0f) | ((h5 & 0x0f) << 4)
+        self.regs[0xe6] = (h5 >> 4) & 0xff
+        pack_into('b', self.regs, 0xe7, h6)
+
+    def set_raw_humidity(self, adc_H: int) -> None:
+        """Set raw 16-bit humidity value."""
+        pack_into('>H', self.regs, 0xfd, adc_H)
+
+
+class INA219Sim(SimulatedDevice):
+
+    """
+    INA219 model with 16-bit (big endian) registers.
+
+    Current and power are computed from the shunt and bus voltage
+    registers and the calibration register, as in the chip.
+    """
+
+    def __init__(self, shunt_voltage: float=0.01,
+                 bus_voltage: float=5.0) -> None:
+        super().__init__()
+        self.words = [0] * 6
+        self.reset()
+        self.set_voltages(shunt_voltage, bus_voltage)
+
+    def reset(self) -> None:
+        self.words[0] = 0x399f
+        self.words[5] = 0
+
+    def set_voltages(self, shunt_voltage: float, bus_voltage: float) -> None:
+        """Set measured voltages (in Volts)."""
+        self.words[1] = int(round(shunt_voltage / 0.00001)) & 0xffff
+        self.words[2] = (int(round(bus_voltage / 0.004)) << 3) | 0x2
+
+    def _word(self, reg: int) -> int:
+        if reg == 3:
+            return (self._word(4) * (self.words[2] >> 3)) // 5000
+        if reg == 4:
+            shunt = unpack_from('<h', pack('<H', self.words[1]))[0]
+            return (shunt * self.words[5] // 4096) & 0xffff
+        return self.words[reg]
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        self.pointer = data[0]
+        if len(data) >= 3 and self.pointer in (0, 5):
+            val = (data[1] << 8) | data[2]
+            if self.pointer == 0 and val & 0x8000:
+                self.reset()
+            else:
+                self.words[self.pointer] = val
+
+    def read(self, length: int) -> bytes:
+        word = pack('>H', self._word(self.pointer) if self.pointer < 6 else 0)
+        return (word * ((length + 1) // 2))[:length]
+
+
+class TSL2561Sim(SimulatedDevice):
+
+    """TSL2561 model (register selected by command byte)."""
+
+    def __init__(self, ch0: int=1000, ch1: int=200) -> None:
+        super().__init__({0x0a: 0x50})
+        self.set_channels(ch0, ch1)
+
+    def set_channels(self, ch0: int, ch1: int) -> None:
+        """Set raw ADC channel values."""
+        pack_into('<HH', self.regs, 0x0c, ch0, ch1)
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        super().write(bytes([data[0] & 0x0f]) + data[1:])
+
+
+class AM2315Sim(SimulatedDevice):
+
+    """AM2315 model with Modbus-like framing and CRC."""
+
+    def __init__(self, humidity: float=50.0,
+                 temperature: float=25.0) -> None:
+        super().__init__()
+        self.request = None
+        pack_into('>HHH', self.regs, 0x08, 0x2315, 0, 0)
+        self.regs[0x0a] = 0x10
+        pack_into('>I', self.regs, 0x0b, 0x12345678)
+        self.set_values(humidity, temperature)
+
+    def set_values(self, humidity: float, temperature: float) -> None:
+        """Set measured humidity (%) and temperature (Celsius)."""
+        temp = int(round(abs(temperature) * 10))
+        if temperature < 0:
+            temp |= 0x8000
+        pack_into('>HH', self.regs, 0x00, int(round(humidity * 10)), temp)
+
+    @staticmethod
+    def crc(data: bytes) -> int:
+        """Compute Modbus CRC16 of data."""
+        crc = 0xffff
+        for byte in data:
+            crc ^= byte
+            for _ in range(8):
+                if crc & 1:
+                    crc = (crc >> 1) ^ 0xa001
+                else:
+                    crc >>= 1
+        return crc
+
+    def write(self, data: bytes) -> None:
+        # Function code 0x03: read registers (start, count)
+        if len(data) == 3 and data[0] == 0x03:
+            self.request = (data[1], data[2])
+
+    def read(self, length: int) -> bytes:
+        if self.request is None:
+            raise OSError(EIO, 'No request')
+        start, count = self.request
+        frame = bytes([0x03, count]) + bytes(self.regs[start:start + count])
+        frame += pack('<H', self.crc(frame))
+        return (frame + bytes(length))[:length]
+
+
+class PCF8574Sim(SimulatedDevice):
+
+    """PCF8574 model with quasi-bidirectional pins."""
+
+    def __init__(self, inputs: int=0xff) -> None:
+        super().__init__()
+        self.latch = 0xff
+        self.inputs = inputs
+        self.history = []  # all written values
+
+    def write(self, data: bytes) -> None:
+        for val in data:
+            self.latch = val
+            self.history.append(val)
+
+    def read(self, length: int) -> bytes:
+        return bytes([self.latch & self.inputs]) * length
+
+
+class HT16K33Sim(SimulatedDevice):
+
+    """HT16K33 model (command bytes and 16 bytes of display RAM)."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.oscillator = False
+        self.display = 0x80
+        self.dimming = 0xef
+
+    def write(self, data: bytes) -> None:
+        if len(data) == 1 and data[0] >= 0x20:
+            cmd = data[0]
+            if cmd & 0xf0 == 0x20:
+                self.oscillator = bool(cmd & 0x01)
+            elif cmd & 0xf0 == 0x80:
+                self.display = cmd
+            elif cmd & 0xf0 == 0xe0:
+                self.dimming = cmd
+            return
+        super().write(data)
+
+    @property
+    def ram(self) -> bytes:
+        """Display RAM contents."""
+        return bytes(self.regs[0:16])
+
+
+class SN3218Sim(SimulatedDevice):
+
+    """SN3218 model (write-only, PWM values latched on update)."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.pwm = bytes(18)
+
+    def write_register(self, reg: int, val: int) -> None:
+        if reg == 0x16:
+            self.pwm = bytes(self.regs[0x01:0x13])
+        elif reg == 0x17:
+            self.regs[:] = bytes(256)
+            self.pwm = bytes(18)
+        else:
+            self.regs[reg] = val
+
+    def read(self, length: int) -> bytes:
+        raise OSError(EIO, 'Device is write-only')
+
+
+class SimulatedBus(object):
+
+    """Simulated I2C bus: attached devices, latency model and counters."""
+
+    def __init__(self, number: int) -> None:
+        self.number = number
+        self.devices = {}
+        self.clock_hz = None
+        self.overhead = 0.0
+        self.lock = Lock()
+        self.reset_stats()
+
+    def attach(self, addr: int, device: SimulatedDevice) -> SimulatedDevice:
+        """Attach device model at specified address."""
+        self.devices[addr] = device
+        return device
+
+    def detach(self, addr: int) -> None:
+        """Remove device from the bus."""
+        del self.devices[addr]
+
+    def reset_stats(self) -> None:
+        """Reset transaction and byte counters."""
+        self.transactions = 0
+        self.bytes = 0
+        self.per_address = {}
+
+    def _device(self, addr: int) -> SimulatedDevice:
+        device = self.devices.get(addr)
+        if device is None:
+            raise OSError(EIO, 'No device at address {}'.format(hex(addr)))
+        return device
+
+    def _account(self, addr: int, nbytes: int, nmsgs: int=1) -> None:
+        """Count transaction and simulate its duration."""
+        self.transactions += 1
+        self.bytes += nbytes
+        self.per_address[addr] = self.per_address.get(addr, 0) + 1
+        if self.clock_hz or self.overhead:
+            delay = self.overhead
+            if self.clock_hz:
+                delay += 9 * (nbytes + nmsgs) / self.clock_hz
+            end = perf_counter() + delay
+            if delay > 0.002:
+                sleep(delay - 0.001)
+            while perf_counter() < end:
+                pass
+
+    def transaction(self, addr: int, write: bytes=b'',
+                    read: int=None) -> bytes:
+        """Perform write (if any) followed by read (if any) on device."""
+        with self.lock:
+            device = self._device(addr)
+            nmsgs = int(bool(write) or read is None) + int(read is not None)
+            self._account(addr, len(write) + (read or 0), nmsgs)
+            if write or read is None:
+                device.write(write)
+            if read is not None:
+                return device.read(read)
+            return b''
+
+
+# Simulated buses, by number
+_buses = {}
+
+
+def bus(number: int) -> SimulatedBus:
+    """Get (create if needed) simulated bus with specified number."""
+    if number not in _buses:
+        _buses[number] = SimulatedBus(number)
+    return _buses[number]
+
+
+class SimulatedSMBus(object):
+
+    """
+    SMBus object connected to a simulated bus.
+
+    Has the same method set as smbus/smbus2 SMBus classes,
+    so it can be used with I2CBus(bus, smbus=SimulatedSMBus).
+    """
+
+    def __init__(self, bus: int=None) -> None:
+        self.sim = None
+        self.pec = False
+        if bus is not None:
+            self.open(bus)
+
+    def open(self, number: int) -> None:
+        self.sim = bus(number)
+
+    def close(self) -> None:
+        self.sim = None
+
+    def _bus(self) -> SimulatedBus:
+        if self.sim is None:
+            raise OSError(9, 'Bad file descriptor')
+        return self.sim
+
+    # SMBus Access
+    def write_quick(self, addr: int) -> None:
+        self._bus().transaction(addr)
+
+    def read_byte(self, addr: int) -> int:
+        return self._bus().transaction(addr, read=1)[0]
+
+    def write_byte(self, addr: int, val: int) -> None:
+        self._bus().transaction(addr, bytes([val]))
+
+    def read_byte_data(self, addr: int, cmd: int) -> int:
+        return self._bus().transaction(addr, bytes([cmd]), 1)[0]
+
+    def write_byte_data(self, addr: int, cmd: int, val: int) -> None:
+        self._bus().transaction(addr, bytes([cmd, val]))
+
+    def read_word_data(self, addr: int, cmd: int) -> int:
+        return unpack_from('<H', self._bus().transaction(
+            addr, bytes([cmd]), 2))[0]
+
+    def write_word_data(self, addr: int, cmd: int, val: int) -> None:
+        self._bus().transaction(addr, bytes([cmd]) + pack('<H', val))
+
+    def process_call(self, addr: int, cmd: int, val: int) -> int:
+        return unpack_from('<H', self._bus().transaction(
+            addr, bytes([cmd]) + pack('<H', val), 2))[0]
+
+    def read_block_data(self, addr: int, cmd: int) -> List[int]:
+        data = self._bus().transaction(addr, bytes([cmd]), 33)
+        return list(data[1:data[0] + 1])
+
+    def write_block_data(self, addr: int, cmd: int, vals: List[int]) -> None:
+        self._bus().transaction(addr, bytes([cmd, len(vals)] + list(vals)))
+
+    def block_process_call(self, addr: int, cmd: int,
+                           vals: List[int]) -> List[int]:
+        data = self._bus().transaction(
+            addr, bytes([cmd, len(vals)] + list(vals)), 33)
+        return list(data[1:data[0] + 1])
+
+    # I2C Access
+    def read_i2c_block_data(self, addr: int, cmd: int,
+                            len: int=32) -> List[int]:
+        return list(self._bus().transaction(addr, bytes([cmd]), len))
+
+    def read_i2c_block_into(self, addr: int, cmd: int, buffer) -> None:
+        view = memoryview(buffer).cast('B')
+        view[:] = self._bus().transaction(addr, bytes([cmd]), len(view))
+
+    def write_i2c_block_data(self, addr: int, cmd: int,
+                             vals: List[int]) -> None:
+        self._bus().transaction(addr, bytes([cmd] + list(vals)))
+
+    # Combined transactions
+    def transfer(self, messages) -> None:
+        sim = self._bus()
+        with sim.lock:
+            devices = [sim._device(msg.addr) for msg in messages]
+            sim._account(messages[0].addr,
+                         sum(len(msg.buf) for msg in messages),
+                         len(messages))
+            for msg, device in zip(messages, devices):
+                if msg.is_read:
+                    msg.buf[:] = device.read(len(msg.buf))
+                else:
+                    device.write(bytes(msg.buf))
@@ -0,0 +1,130 @@
+"""
+This module defines transaction statistics collected by I2CBus
+(see I2CBus.enable_stats).
+
+For each device address and operation type, the number of transactions,
+bytes read and written (payload, without address bytes), errors
+by errno, and a histogram of wall-clock latency are recorded.
+"""
+
+from threading import Lock
+from time import perf_counter
+
+
+# Bytes (written, read) by SMBus operations with fixed sizes
+_FIXED_SIZES = {
+    'write_quick': (0, 0),
+    'read_byte': (0, 1),
+    'write_byte': (1, 0),
+    'read_byte_data': (1, 1),
+    'write_byte_data': (2, 0),
+    'read_word_data': (1, 2),
+    'write_word_data': (3, 0),
+    'process_call': (3, 2),
+}
+
+
+def _payload(name: str, args: tuple, result) -> tuple:
+    """Return number of bytes (written, read) by operation."""
+    sizes = _FIXED_SIZES.get(name)
+    if sizes is not None:
+        return sizes
+    if name == 'read_block_data':
+        return 1, len(result) + 1
+    if name == 'write_block_data':
+        return len(args[1]) + 2, 0
+    if name == 'block_process_call':
+        return len(args[1]) + 2, len(result) + 1
+    if name == 'read_i2c_block_data':
+        return 1, len(result)
+    if name == 'read_i2c_block_into':
+        return 1, len(args[1])
+    if name == 'write_i2c_block_data':
+        return len(args[1]) + 1, 0
+    if name == 'transfer':
+        written = read = 0
+        for msg in args[0]:
+            if msg.is_read:
+                read += len(msg.buf)
+            else:
+                written += len(msg.buf)
+        return written, read
+    return 0, 0
+
+
+class I2CStats(object):
+
+    """
+    Transaction statistics of one bus.
+
+    Latency histogram bucket i counts transactions which took
+    less than 2**i microseconds (and at least 2**(i-1)),
+    the last bucket counts all slower ones (over ~1 second).
+    """
+
+    BUCKETS = 21
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._data = {}
+
+    def call(self, func, name: str, addr: int, args: tuple):
+        """Call func(addr, *args) and record it as transaction name."""
+        start = perf_counter()
+        try:
+            result = func(addr, *args)
+        except OSError as err:
+            self._record(addr, name, perf_counter() - start, 0, 0, err.errno)
+            raise
+        elapsed = perf_counter() - start
+        written, read = _payload(name, args, result)
+        self._record(addr, name, elapsed, written, read)
+        return result
+
+    def _record(self, addr: int, name: str, elapsed: float,
+                written: int, read: int, errno: int=None) -> None:
+        bucket = min(int(elapsed * 1e6).bit_length(), self.BUCKETS - 1)
+        with self._lock:
+            entry = self._data.get((addr, name))
+            if entry is None:
+                # count, written, read, total time, max time, histogram, errors
+                entry = self._data[(addr, name)] = [
+                    0, 0, 0, 0.0, 0.0, [0] * self.BUCKETS, {}]
+            entry[0] += 1
+            entry[1] += written
+            entry[2] += read
+            entry[3] += elapsed
+            if elapsed > entry[4]:
+                entry[4] = elapsed
+            entry[5][bucket] += 1
+            if errno is not None:
+                entry[6][errno] = entry[6].get(errno, 0) + 1
+
+    def snapshot(self) -> dict:
+        """
+        Return copy of current statistics as nested dictionaries:
+        {address: {operation: {'count', 'bytes_written', 'bytes_read',
+        'total_time', 'max_time', 'histogram', 'errors'}}}
+        (times in seconds, errors as {errno: count}).
+        """
+        with self._lock:
+            items = [(key, list(entry[:5]), list(entry[5]), dict(entry[6]))
+                     for key, entry in self._data.items()]
+        result = {}
+        for (addr, name), counters, histogram, errors in items:
+            count, written, read, total, longest = counters
+            result.setdefault(addr, {})[name] = {
+                'count': count,
+                'bytes_written': written,
+                'bytes_read': read,
+                'total_time': total,
+                'max_time': longest,
+                'histogram': histogram,
+                'errors': errors,
+            }
+        return result
+
+    def reset(self) -> None:
+        """Clear all statistics."""
+        with self._lock:
+            self._data = {}
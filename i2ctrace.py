@@ -0,0 +1,335 @@
+"""
+This module defines recording of I2CBus transactions into compact
+binary trace files (see I2CBus.start_trace), and a replay SMBus
+feeding recorded responses back to drivers, without hardware:
+
+    i2c.set_default_smbus(i2ctrace.replay_smbus('bme280.trace'))
+    sensor = BME280(1)
+
+File format (little endian): header b'I2CT', version (B), bus (h),
+then entries: timestamp in seconds from start (d), address (B),
+operation (B), register (H, 0xffff if none), errno (H, 0 if none),
+argument length (H), result length (H), argument bytes, result bytes.
+Arguments of combined transactions (transfer) are address (H), flags (H),
+length (H) and written data of each message (version 1 traces lack
+the address), results are the data read, concatenated.
+"""
+
+from struct import Struct, pack, unpack_from
+from threading import Lock
+from time import perf_counter
+try:
+    from typing import List
+except ImportError as err:
+    raise ImportError(
+        'Typing module must be manually installed on Python < 3.5') from err
+
+
+MAGIC = b'I2CT'
+VERSION = 2
+_HEADER = Struct('<4sBh')
+_ENTRY = Struct('<dBBHHHH')
+NO_REGISTER = 0xffff
+
+# Operation name: (has register, argument type, result type)
+# Types: '' - none, 'int' - 16-bit integer, 'bytes' - byte list,
+# 'len' - length of buffer argument
+OPERATIONS = [
+    ('write_quick', (False, '', '')),
+    ('read_byte', (False, '', 'int')),
+    ('write_byte', (False, 'int', '')),
+    ('read_byte_data', (True, '', 'int')),
+    ('write_byte_data', (True, 'int', '')),
+    ('read_word_data', (True, '', 'int')),
+    ('write_word_data', (True, 'int', '')),
+    ('process_call', (True, 'int', 'int')),
+    ('read_block_data', (True, '', 'bytes')),
+    ('write_block_data', (True, 'bytes', '')),
+    ('block_process_call', (True, 'bytes', 'bytes')),
+    ('read_i2c_block_data', (True, 'int', 'bytes')),
+    ('read_i2c_block_into', (True, 'len', 'bytes')),
+    ('write_i2c_block_data', (True, 'bytes', '')),
+    ('transfer', (False, 'msgs', 'bytes')),
+]
+_CODES = {name: code for code, (name, _) in enumerate(OPERATIONS)}
+
+
+class TraceError(Exception):
+    pass
+
+
+class TraceEntry(object):
+
+    """Single recorded transaction."""
+
+    __slots__ = ('time', 'addr', 'op', 'cmd', 'errno', 'arg', 'result')
+
+    def __init__(self, time, addr, op, cmd, errno, arg, result) -> None:
+        self.time = time
+        self.addr = addr
+        self.op = op
+        self.cmd = cmd
+        self.errno = errno
+        self.arg = arg
+        self.result = result
+
+    def __repr__(self):
+        return 'TraceEntry({:.6f}, {}, {}, {}, errno={}, {}, {})'.format(
+            self.time, hex(self.addr), self.op, self.cmd, self.errno,
+            self.arg, self.result)
+
+
+def _encode(kind: str, value) -> bytes:
+    if kind == 'int':
+        return pack('<H', value & 0xffff)
+    if kind == 'bytes':
+        return bytes(value)
+    if kind == 'len':
+        return pack('<H', len(memoryview(value).cast('B')))
+    if kind == 'msgs':
+        # address, flags and length of each message, then written data
+        return b''.join(pack('<HHH', msg.addr, msg.flags, len(msg.buf)) +
+                        (b'' if msg.is_read else bytes(msg.buf))
+                        for msg in value)
+    return b''
+
+
+def _decode(kind: str, data: bytes, version: int=VERSION):
+    if not data:
+        return b'' if kind == 'bytes' else None
+    if kind in ('int', 'len'):
+        return unpack_from('<H', data)[0]
+    if kind == 'bytes':
+        return list(data)
+    if kind == 'msgs':
+        msgs = []
+        offset = 0
+        while offset < len(data):
+            if version < 2:
+                addr = None
+                flags, length = unpack_from('<HH', data, offset)
+                offset += 4
+            else:
+                addr, flags, length = unpack_from('<HHH', data, offset)
+                offset += 6
+            if flags & 0x0001:
+                msgs.append((addr, flags, length, None))
+            else:
+                msgs.append((addr, flags, length,
+                             data[offset:offset + length]))
+                offset += length
+        return msgs
+    return None
+
+
+class TraceRecorder(object):
+
+    """Writer of trace files (used through I2CBus.start_trace)."""
+
+    def __init__(self, path: str, bus: int=-1) -> None:
+        self._lock = Lock()
+        self._file = open(path, 'wb')
+        self._file.write(_HEADER.pack(MAGIC, VERSION, bus))
+        self._start = perf_counter()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def call(self, func, name: str, addr: int, args: tuple):
+        """Call func(addr, *args) and record it as transaction name."""
+        has_cmd, arg_kind, result_kind = OPERATIONS[_CODES[name]][1]
+        cmd = args[0] if has_cmd else NO_REGISTER
+        value = args[-1] if arg_kind else None
+        time = perf_counter() - self._start
+        code = _CODES[name]
+        arg = _encode(arg_kind, value)
+        try:
+            result = func(addr, *args)
+        except OSError as err:
+            self._write(time, addr, code, cmd, err.errno or 0, arg, b'')
+            raise
+        if name == 'transfer':
+            recorded = b''.join(bytes(msg.buf) for msg in args[0]
+                                if msg.is_read)
+        elif name == 'read_i2c_block_into':
+            recorded = bytes(memoryview(args[1]).cast('B'))
+        else:
+            recorded = _encode(result_kind, result)
+        self._write(time, addr, code, cmd, 0, arg, recorded)
+        return result
+
+    def _write(self, time, addr, code, cmd, errno, arg, result) -> None:
+        with self._lock:
+            self._file.write(_ENTRY.pack(time, addr, code, cmd, errno,
+                                         len(arg), len(result)))
+            self._file.write(arg)
+            self._file.write(result)
+
+
+def read_trace(path: str) -> (int, List[TraceEntry]):
+    """Read trace file, return (bus number, list of entries)."""
+    with open(path, 'rb') as infile:
+        data = infile.read()
+    magic, version, bus = _HEADER.unpack_from(data)
+    if magic != MAGIC or not 1 <= version <= VERSION:
+        raise TraceError('Not a supported I2C trace file')
+    entries = []
+    offset = _HEADER.size
+    while offset < len(data):
+        time, addr, code, cmd, errno, arglen, reslen = \
+            _ENTRY.unpack_from(data, offset)
+        offset += _ENTRY.size
+        name, (has_cmd, arg_kind, result_kind) = OPERATIONS[code]
+        arg = _decode(arg_kind, data[offset:offset + arglen], version)
+        offset += arglen
+        result = _decode(result_kind, data[offset:offset + reslen])
+        offset += reslen
+        entries.append(TraceEntry(time, addr, name,
+                                  cmd if has_cmd else None,
+                                  errno or None, arg, result))
+    return bus, entries
+
+
+class ReplaySMBus(object):
+
+    """
+    SMBus object returning responses recorded in a trace.
+
+    In strict mode, transactions must come exactly in recorded order
+    (address, operation and register), otherwise TraceError is raised.
+    Otherwise responses are looked up by (address, operation, register),
+    in recorded order, and the last one is repeated when they run out,
+    which allows replaying a workload against modified drivers;
+    transactions without any recorded response raise TraceError.
+    Recorded errors are raised again as OSError.
+
+    Use replay_smbus() to create a class bound to a trace file.
+    """
+
+    entries = []
+    strict = True
+
+    def __init__(self, bus: int=None) -> None:
+        self.pec = False
+        self.position = 0
+        self.misses = 0
+        self._queues = {}
+        if not self.strict:
+            for entry in self.entries:
+                key = (entry.addr, entry.op, entry.cmd)
+                self._queues.setdefault(key, []).append(entry)
+            self._used = dict.fromkeys(self._queues, 0)
+
+    def open(self, bus: int) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def _next(self, addr: int, name: str, cmd: int=None,
+              fallback: str=None) -> TraceEntry:
+        """
+        Find recorded transaction matching the request (operation name,
+        or fallback, if the trace was recorded with a backend without
+        the operation).
+        """
+        if self.strict:
+            if self.position >= len(self.entries):
+                raise TraceError('Trace exhausted')
+            entry = self.entries[self.position]
+            if ((entry.addr, entry.cmd) != (addr, cmd) or
+                    entry.op not in (name, fallback)):
+                raise TraceError('Expected {}, got {} {} {}'.format(
+                    entry, hex(addr), name, cmd))
+            self.position += 1
+        else:
+            key = (addr, name, cmd)
+            queue = self._queues.get(key)
+            if not queue and fallback is not None:
+                key = (addr, fallback, cmd)
+                queue = self._queues.get(key)
+            if not queue:
+                raise TraceError('No recorded response for {} {} {}'.format(
+                    hex(addr), name, cmd))
+            used = self._used[key]
+            if used >= len(queue):
+                self.misses += 1
+                used = len(queue) - 1
+            entry = queue[used]
+            self._used[key] = used + 1
+        if entry.errno:
+            raise OSError(entry.errno, 'Recorded error')
+        return entry
+
+    # SMBus Access
+    def write_quick(self, addr: int) -> None:
+        self._next(addr, 'write_quick')
+
+    def read_byte(self, addr: int) -> int:
+        return self._next(addr, 'read_byte').result
+
+    def write_byte(self, addr: int, val: int) -> None:
+        self._next(addr, 'write_byte')
+
+    def read_byte_data(self, addr: int, cmd: int) -> int:
+        return self._next(addr, 'read_byte_data', cmd).result
+
+    def write_byte_data(self, addr: int, cmd: int, val: int) -> None:
+        self._next(addr, 'write_byte_data', cmd)
+
+    def read_word_data(self, addr: int, cmd: int) -> int:
+        return self._next(addr, 'read_word_data', cmd).result
+
+    def write_word_data(self, addr: int, cmd: int, val: int) -> None:
+        self._next(addr, 'write_word_data', cmd)
+
+    def process_call(self, addr: int, cmd: int, val: int) -> int:
+        return self._next(addr, 'process_call', cmd).result
+
+    def read_block_data(self, addr: int, cmd: int) -> List[int]:
+        return list(self._next(addr, 'read_block_data', cmd).result)
+
+    def write_block_data(self, addr: int, cmd: int, vals: List[int]) -> None:
+        self._next(addr, 'write_block_data', cmd)
+
+    def block_process_call(self, addr: int, cmd: int,
+                           vals: List[int]) -> List[int]:
+        return list(self._next(addr, 'block_process_call', cmd).result)
+
+    # I2C Access
+    def read_i2c_block_data(self, addr: int, cmd: int,
+                            len: int=32) -> List[int]:
+        return list(self._next(addr, 'read_i2c_block_data', cmd).result)
+
+    def read_i2c_block_into(self, addr: int, cmd: int, buffer) -> None:
+        view = memoryview(buffer).cast('B')
+        # Recorded as read_i2c_block_data by backends without it
+        view[:] = bytes(self._next(addr, 'read_i2c_block_into', cmd,
+                                   'read_i2c_block_data').result)
+
+    def write_i2c_block_data(self, addr: int, cmd: int,
+                             vals: List[int]) -> None:
+        self._next(addr, 'write_i2c_block_data', cmd)
+
+    # Combined transactions
+    def transfer(self, messages) -> None:
+        entry = self._next(messages[0].addr, 'transfer')
+        recorded = [addr for addr, _, _, _ in entry.arg or ()]
+        if None not in recorded and recorded != [msg.addr
+                                                  for msg in messages]:
+            raise TraceError('Expected {}, got transfer with {}'.format(
+                entry, [hex(msg.addr) for msg in messages]))
+        data = bytes(entry.result)
+        offset = 0
+        for msg in messages:
+            if msg.is_read:
+                msg.buf[:] = data[offset:offset + len(msg.buf)]
+                offset += len(msg.buf)
+
+
+def replay_smbus(path: str, strict: bool=True):
+    """Create ReplaySMBus class replaying the specified trace file."""
+    _, entries = read_trace(path)
+    return type('ReplaySMBus', (ReplaySMBus,),
+                {'entries': entries, 'strict': strict})
@@ -56,8 +56,11 @@ class INA219(object):
 
     def __init__(self, bus=None, address=0x40) -> None:
         """Create object representing INA219 chip."""
-        self._bus = I2CBus(bus)
+        # Latency-critical measurements go before bulk traffic
+        self._bus = I2CBus(bus, priority=I2CBus.PRIORITY_HIGH)
         self.addr = address
+        # Skip rewriting unchanged calibration in power() and current()
+        self._bus.cache_registers(self.addr, self.CALIBRATION)
         self._init_params()
 
     def _init_params(self) -> None:
@@ -180,6 +183,7 @@ class INA219(object):
     def reset(self) -> None:
         """Reset INA219 chip."""
         self._bus.write_word_swapped(self.addr, self.CONFIG, self.RESET)
+        self._bus.invalidate(self.addr)
         self._init_params()
 
     def shunt_voltage(self) -> float:
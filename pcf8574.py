@@ -34,6 +34,8 @@ class PCF8574(object):
         """
         self.address = address
         self._bus = I2CBus(bus)
+        # Skip writes that would not change the output latch
+        self._bus.cache_registers(self.address, None)
         self._pins = [1] * 8
 
     def read_byte(self):
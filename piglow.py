@@ -29,39 +29,45 @@ class PiGlow(SN3218):
 
     def white(self, value, gamma=True, update=True):
         """Set white LED PWM output."""
-        for led in [6, 12, 18]:
-            self.led(led, value, gamma, update=False)
-        self.update(update)
+        with self._bus.batch(auto_increment=True):
+            for led in [6, 12, 18]:
+                self.led(led, value, gamma, update=False)
+            self.update(update)
     
     def blue(self, value, gamma=True, update=True):
         """Set blue LED PWM output."""
-        for led in [5, 11, 17]:
-            self.led(led, value, gamma, update=False)
-        self.update(update)
+        with self._bus.batch(auto_increment=True):
+            for led in [5, 11, 17]:
+                self.led(led, value, gamma, update=False)
+            self.update(update)
     
     def green(self, value, gamma=True, update=True):
         """Set green LED PWM output."""
-        for led in [4, 10, 16]:
-            self.led(led, value, gamma, update=False)
-        self.update(update)
+        with self._bus.batch(auto_increment=True):
+            for led in [4, 10, 16]:
+                self.led(led, value, gamma, update=False)
+            self.update(update)
     
     def yellow(self, value, gamma=True, update=True):
         """Set yellow LED PWM output."""
-        for led in [3, 9, 15]:
-            self.led(led, value, gamma, update=False)
-        self.update(update)
+        with self._bus.batch(auto_increment=True):
+            for led in [3, 9, 15]:
+                self.led(led, value, gamma, update=False)
+            self.update(update)
     
     def orange(self, value, gamma=True, update=True):
         """Set orange LED PWM output."""
-        for led in [2, 8, 14]:
-            self.led(led, value, gamma, update=False)
-        self.update(update)
+        with self._bus.batch(auto_increment=True):
+            for led in [2, 8, 14]:
+                self.led(led, value, gamma, update=False)
+            self.update(update)
     
     def red(self, value, gamma=True, update=True):
         """Set red LED PWM output."""
-        for led in [1, 7, 13]:
-            self.led(led, value, gamma, update=False)
-        self.update(update)
+        with self._bus.batch(auto_increment=True):
+            for led in [1, 7, 13]:
+                self.led(led, value, gamma, update=False)
+            self.update(update)
     
     def color(self, color, value, gamma=True, update=True):
         """Set any color LED PWM output."""
@@ -90,9 +96,10 @@ class PiGlow(SN3218):
             leds = range(13,19)
         else:
             raise SN3218Error('Arm number out of range')
-        for led in leds:
-            self.led(led, value, gamma, update=False)
-        self.update(update)
+        with self._bus.batch(auto_increment=True):
+            for led in leds:
+                self.led(led, value, gamma, update=False)
+            self.update(update)
 
 
 class PiGlowDisplay(PiGlow):
@@ -147,27 +154,31 @@ class PiGlowDisplay(PiGlow):
             sleep(10)
     
     def ok(self, message=False):
-        self.all(0, update=False)
-        self.green(50, update=False)
-        self.update()
+        with self._bus.batch(auto_increment=True):
+            self.all(0, update=False)
+            self.green(50, update=False)
+            self.update()
         self.wait(message)
     
     def warning(self, message=False):
-        self.all(0, update=False)
-        self.yellow(100, update=False)
-        self.update()
+        with self._bus.batch(auto_increment=True):
+            self.all(0, update=False)
+            self.yellow(100, update=False)
+            self.update()
         self.wait(message)
 
     def off(self, message=False):
-        self.all(0, update=False)
-        self.red(50, update=False)
-        self.update()
+        with self._bus.batch(auto_increment=True):
+            self.all(0, update=False)
+            self.red(50, update=False)
+            self.update()
         self.wait(message)
     
     def special(self, message=False):
-        self.all(0, update=False)
-        self.blue(50, update=False)
-        self.update()
+        with self._bus.batch(auto_increment=True):
+            self.all(0, update=False)
+            self.blue(50, update=False)
+            self.update()
         self.wait(message)
     
     def percent(self, number,white=False):
@@ -176,11 +187,12 @@ class PiGlowDisplay(PiGlow):
             number = 0
         if number > 100:
             number = 100
-        self.all(0, update=False)
-        for i in range(5):
-            if number >= (i*20):
-                self.color(i+1,50, update=False)
-        if white:
-            self.white(50, update=False)
-        self.update()
+        with self._bus.batch(auto_increment=True):
+            self.all(0, update=False)
+            for i in range(5):
+                if number >= (i*20):
+                    self.color(i+1,50, update=False)
+            if white:
+                self.white(50, update=False)
+            self.update()
         self.wait()
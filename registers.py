@@ -0,0 +1,153 @@
+"""
+This module defines register access to devices independent of
+the transport, so drivers of chips with both I2C and SPI interfaces
+(like BMP280 and BME280) work over either of them:
+
+    sensor = BMP280(interface=SPIRegisters(SPI(0, 0)))
+
+Both classes implement the same methods: read_byte(reg),
+write_byte(reg, val), read(reg, length), read_into(reg, buffer)
+and write(reg, data) (burst access to consecutive registers),
+exclusive(), cache_registers(*regs) and invalidate(reg=None).
+"""
+
+from contextlib import contextmanager
+from threading import RLock
+
+from i2c import I2CBus
+from spi import SPISegment
+
+
+class I2CRegisters(object):
+
+    """Registers of the device at address addr of an I2CBus."""
+
+    def __init__(self, bus: I2CBus, addr: int) -> None:
+        self.bus = bus
+        self.addr = addr
+
+    def read_byte(self, reg: int) -> int:
+        """Read single register."""
+        return self.bus.read_byte_data(self.addr, reg)
+
+    def write_byte(self, reg: int, val: int) -> None:
+        """Write single register."""
+        self.bus.write_byte_data(self.addr, reg, val)
+
+    def read(self, reg: int, length: int) -> bytes:
+        """Read length consecutive registers, starting with reg."""
+        return self.bus.read_i2c_block_bytes(self.addr, reg, length)
+
+    def read_into(self, reg: int, buffer) -> None:
+        """Read consecutive registers, starting with reg, into buffer."""
+        self.bus.read_i2c_block_into(self.addr, reg, buffer)
+
+    def write(self, reg: int, data) -> None:
+        """Write data to consecutive registers, starting with reg."""
+        self.bus.write_i2c_block_data(self.addr, reg, list(data))
+
+    def exclusive(self):
+        """Context manager for atomic sequences (see I2CBus.exclusive)."""
+        return self.bus.exclusive()
+
+    def cache_registers(self, *regs: int) -> None:
+        """Enable write caching of registers (see I2CBus.cache_registers)."""
+        self.bus.cache_registers(self.addr, *regs)
+
+    def invalidate(self, reg: int=None) -> None:
+        """Forget cached values of a register (or of all registers)."""
+        self.bus.invalidate(self.addr, reg)
+
+
+class SPIRegisters(object):
+
+    """
+    Registers of a device on SPI, using the convention of Bosch
+    sensors (and many others): bit 7 of the register address is set
+    for reads (READ_BIT) and cleared for writes (WRITE_MASK).
+    Reads auto-increment the address, multi-register writes are sent
+    as pairs of address and value.
+
+    spi is an SPI object, or anything else with the message() method
+    (like SPIDevice of SPIBus).
+    """
+
+    READ_BIT = 0x80
+    WRITE_MASK = 0x7f
+
+    def __init__(self, spi, read_bit: int=READ_BIT,
+                 write_mask: int=WRITE_MASK) -> None:
+        self.bus = spi
+        self.read_bit = read_bit
+        self.write_mask = write_mask
+        self._lock = RLock()
+        self._cache = {}
+        self._command = bytearray(1)
+        self._byte = bytearray(1)
+
+    def read_byte(self, reg: int) -> int:
+        """Read single register."""
+        with self._lock:
+            self.read_into(reg, self._byte)
+            return self._byte[0]
+
+    def write_byte(self, reg: int, val: int) -> None:
+        """Write single register."""
+        self.write(reg, (val,))
+
+    def read(self, reg: int, length: int) -> bytes:
+        """Read length consecutive registers, starting with reg."""
+        buffer = bytearray(length)
+        self.read_into(reg, buffer)
+        return bytes(buffer)
+
+    def read_into(self, reg: int, buffer) -> None:
+        """Read consecutive registers, starting with reg, into buffer."""
+        with self._lock:
+            self._command[0] = reg | self.read_bit
+            self.bus.message([SPISegment(self._command, None, 1),
+                              SPISegment(None, buffer)])
+
+    def write(self, reg: int, data) -> None:
+        """Write data to consecutive registers, starting with reg."""
+        data = bytes(data)
+        with self._lock:
+            if self._cache and all(
+                    (reg + i) in self._cache and
+                    self._cache[reg + i] == val
+                    for i, val in enumerate(data)):
+                return
+            frame = bytearray(2 * len(data))
+            for i, val in enumerate(data):
+                frame[2 * i] = (reg + i) & self.write_mask
+                frame[2 * i + 1] = val
+            try:
+                self.bus.message([SPISegment(frame)])
+            except Exception:
+                self.invalidate()
+                raise
+            for i, val in enumerate(data):
+                if (reg + i) in self._cache:
+                    self._cache[reg + i] = val
+
+    @contextmanager
+    def exclusive(self):
+        """Context manager performing a sequence of accesses atomically."""
+        with self._lock:
+            yield self
+
+    def cache_registers(self, *regs: int) -> None:
+        """
+        Enable write caching for specified registers: writes that would
+        not change the last written value are skipped.
+        """
+        with self._lock:
+            for reg in regs:
+                self._cache.setdefault(reg, None)
+
+    def invalidate(self, reg: int=None) -> None:
+        """Forget cached values of a register (or of all registers)."""
+        with self._lock:
+            for key in self._cache:
+                if reg is None or key == reg:
+                    self._cache[key] = None
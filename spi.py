@@ -9,29 +9,170 @@ Because the SPI device interface is opened R/W, users of this
 module usually must have root permissions.
 """
 
+# Kernel interface documentation:
+# https://git.kernel.org/cgit/linux/kernel/git/torvalds/
+#     linux.git/plain/Documentation/spi/spidev
+
+
+from ctypes import Structure, addressof, c_uint8, c_uint16, c_uint32, c_uint64
+from fcntl import ioctl
+from threading import RLock
 try:
     from typing import List
 except ImportError as err:
     raise ImportError(
         'Typing module must be manually installed on Python < 3.5') from err
 
-try:
-    from spidev import SpiDev
-except ImportError as err:
-    raise ImportError('No spidev module') from err
+# SpiDev class, imported on first use (see _backend)
+_spidev_class = None
+
+
+def _backend():
+    """Return spidev.SpiDev class, importing it on first use."""
+    global _spidev_class
+    if _spidev_class is None:
+        try:
+            from spidev import SpiDev
+        except ImportError as err:
+            raise ImportError('No spidev module') from err
+        _spidev_class = SpiDev
+    return _spidev_class
+
+
+def set_default_spidev(spidev=None) -> None:
+    """
+    Set SpiDev class used by SPI objects created without
+    the spidev argument, e.g. a simulated device from the spisim module.
+    None restores spidev.SpiDev.
+    """
+    SPI._default_spidev = spidev
+
+
+# Default size of spidev kernel buffer (maximum transfer length)
+SPIDEV_BUFSIZ = 4096
+
+# Detected size of spidev kernel buffer (see _getBufsiz)
+_bufsiz = None
+
+
+def _getBufsiz() -> int:
+    """
+    Get maximum length of a single spidev transfer
+    (detected once per process).
+    """
+    global _bufsiz
+    if _bufsiz is None:
+        try:
+            with open('/sys/module/spidev/parameters/bufsiz', 'r') as infile:
+                _bufsiz = int(infile.read())
+        except (OSError, ValueError):
+            _bufsiz = SPIDEV_BUFSIZ
+    return _bufsiz
 
 
 class SPIError(OSError):
     pass
 
 
+class spi_ioc_transfer(Structure):
+    _fields_ = [('tx_buf', c_uint64),
+                ('rx_buf', c_uint64),
+                ('len', c_uint32),
+                ('speed_hz', c_uint32),
+                ('delay_usecs', c_uint16),
+                ('bits_per_word', c_uint8),
+                ('cs_change', c_uint8),
+                ('tx_nbits', c_uint8),
+                ('rx_nbits', c_uint8),
+                ('word_delay_usecs', c_uint8),
+                ('pad', c_uint8)]
+
+
+def SPI_IOC_MESSAGE(count: int) -> int:
+    """ioctl command transferring count segments (linux/spi/spidev.h)."""
+    # _IOW(SPI_IOC_MAGIC, 0, char[SPI_MSGSIZE(count)])
+    return (1 << 30) | ((count * 32) << 16) | (ord('k') << 8)
+
+
+class SPISegment(object):
+
+    """
+    Single segment of a multi-segment SPI transaction (see SPI.message).
+
+    Mirrors the kernel spi_ioc_transfer structure: data to send (tx,
+    None sends zeros), buffer for received data (rx, None discards it),
+    and settings of the segment (0 means the device setting).
+    With cs_change=True, CS is released after the segment (or, after
+    the last segment, kept active until the next transaction).
+    """
+
+    __slots__ = ('tx', 'rx', 'length', 'speed_hz', 'delay_usecs',
+                 'bits_per_word', 'cs_change')
+
+    def __init__(self, tx=None, rx=None, length: int=None, *,
+                 speed_hz: int=0, delay_usecs: int=0, bits_per_word: int=0,
+                 cs_change: bool=False) -> None:
+        if length is None:
+            length = len(memoryview(tx if tx is not None else rx).cast('B'))
+        self.tx = tx
+        self.rx = rx
+        self.length = length
+        self.speed_hz = speed_hz
+        self.delay_usecs = delay_usecs
+        self.bits_per_word = bits_per_word
+        self.cs_change = cs_change
+
+    def __repr__(self):
+        return 'SPISegment({} bytes, tx={}, rx={})'.format(
+            self.length, self.tx is not None, self.rx is not None)
+
+    @classmethod
+    def write(cls, data, **settings) -> 'SPISegment':
+        """Create segment sending data (received data is discarded)."""
+        return cls(data, None, **settings)
+
+    @classmethod
+    def read(cls, length: int, **settings) -> 'SPISegment':
+        """Create segment receiving length bytes (sending zeros)."""
+        return cls(None, bytearray(length), **settings)
+
+    @classmethod
+    def transfer(cls, data, **settings) -> 'SPISegment':
+        """Create segment sending data and receiving the same length."""
+        return cls(data, bytearray(len(memoryview(data).cast('B'))),
+                   **settings)
+
+
+def _address(data, length: int, buffers: list) -> int:
+    """Return address of buffer with length bytes of data."""
+    view = memoryview(data).cast('B')
+    if len(view) < length:
+        raise ValueError('SPI segment buffer shorter than its length')
+    if view.readonly:
+        buf = (c_uint8 * length).from_buffer_copy(view[:length])
+    else:
+        buf = (c_uint8 * length).from_buffer(view)
+    buffers.append(buf)
+    return addressof(buf)
+
+
 class SPI(object):
 
     """
     SPI object that is (optionally) connected to the
     specified SPI device interface.
+
+    The device class (spidev.SpiDev by default) can be replaced
+    with the spidev argument, e.g. SPI(0, 0, spidev=SimulatedSpiDev).
+
+    Buffer transfers (message, write, read_into, transfer) of one object
+    are serialized between threads, so transfers larger than the spidev
+    buffer are not interleaved with other transfers of the object.
     """
 
+    # SpiDev class used when none is specified (see set_default_spidev)
+    _default_spidev = None
+
     @property
     def bits_per_word(self):
         """bits per word"""
@@ -127,16 +268,20 @@ class SPI(object):
     def threewire(self):
         raise TypeError('Cannot delete attribute')
 
-    def __init__(self, bus: int=None, client: int=None) -> None:
+    def __init__(self, bus: int=None, client: int=None, *,
+                 spidev=None) -> None:
+        self._lock = RLock()
+        if spidev is None:
+            spidev = self._default_spidev or _backend()
         if bus is not None and client is not None:
             try:
-                self.dev = SpiDev(bus, client)
+                self.dev = spidev(bus, client)
             except FileNotFoundError as err:
                 raise FileNotFoundError('Specified SPI bus/device not found') from err
             except OSError as err:
                 raise SPIError(err.errno, 'Could not connect to SPI bus') from err
         else:
-            self.dev = SpiDev()
+            self.dev = spidev()
 
     def close(self) -> None:
         """Disconnects the object from the interface."""
@@ -199,3 +344,129 @@ class SPI(object):
             raise SPIError(err.errno, 'SPI device not open') from err
         except SystemError as err:
             raise TypeError('argument must be a list') from err
+
+    # Buffer transfers
+    def message(self, segments: List[SPISegment]) -> None:
+        """
+        Perform multi-segment SPI transaction in a single
+        SPI_IOC_MESSAGE ioctl, e.g. a command, payload and readback
+        with their own speeds, delays and word sizes.
+
+        CS is held active between segments (unless cs_change is set);
+        received data is stored into rx buffers in place.
+        Total length of all segments is limited by the spidev buffer
+        (ValueError is raised for longer messages).
+
+        Device classes without a file descriptor (like simulated ones)
+        perform it by their own message() method.
+        """
+        total = sum(segment.length for segment in segments)
+        if total > _getBufsiz():
+            raise ValueError(
+                'SPI message of {} bytes exceeds spidev buffer size ({})'
+                .format(total, _getBufsiz()))
+        if hasattr(self.dev, 'message'):
+            try:
+                with self._lock:
+                    self.dev.message(segments)
+            except OSError as err:
+                raise SPIError(err.errno, 'SPI transaction failed') from err
+            return
+        count = len(segments)
+        transfers = (spi_ioc_transfer * count)()
+        buffers = []
+        for segment, raw in zip(segments, transfers):
+            if segment.tx is not None:
+                raw.tx_buf = _address(segment.tx, segment.length, buffers)
+            if segment.rx is not None:
+                raw.rx_buf = _address(segment.rx, segment.length, buffers)
+            raw.len = segment.length
+            raw.speed_hz = segment.speed_hz
+            raw.delay_usecs = segment.delay_usecs
+            raw.bits_per_word = segment.bits_per_word
+            raw.cs_change = int(bool(segment.cs_change))
+        try:
+            with self._lock:
+                ioctl(self.fileno(), SPI_IOC_MESSAGE(count), transfers)
+        except OSError as err:
+            raise SPIError(err.errno, 'SPI transaction failed') from err
+        del buffers
+
+    def _chunks(self, length: int):
+        """
+        Return (start, end, cs_change) of parts fitting the kernel
+        buffer (a single part if length fits). A message cannot exceed
+        the buffer, so each part is a separate message: cs_change is set
+        on all but the last one, asking the controller to keep CS active
+        after them (some controllers ignore it). Iterate while holding
+        the lock of the object.
+        """
+        size = _getBufsiz()
+        return ((start, min(start + size, length), start + size < length)
+                for start in range(0, length, size))
+
+    def write(self, data) -> None:
+        """
+        Write bytes, bytearray or memoryview to SPI device.
+
+        Data larger than the spidev buffer is written in parts
+        (see _chunks): other transfers of this object wait for all of
+        them, but other processes may use the bus in between and CS
+        may be released, unless the controller honours cs_change.
+        """
+        view = memoryview(data).cast('B')
+        with self._lock:
+            for start, end, cs_change in self._chunks(len(view)):
+                self.message([SPISegment(view[start:end],
+                                         cs_change=cs_change)])
+
+    def read_into(self, buffer) -> None:
+        """
+        Read from SPI device into a buffer (bytearray or writable
+        memoryview), filling it completely.
+
+        Reads larger than the spidev buffer are done in parts,
+        with the same limitations as in write.
+        """
+        view = memoryview(buffer).cast('B')
+        with self._lock:
+            for start, end, cs_change in self._chunks(len(view)):
+                self.message([SPISegment(None, view[start:end],
+                                         cs_change=cs_change)])
+
+    def transfer(self, data, out=None):
+        """
+        Perform SPI transaction with bytes, bytearray or memoryview.
+
+        Received bytes are stored into out (a buffer of the same length
+        as data, may be the data buffer itself), or into a new bytearray
+        if out is None. Returns the buffer with received bytes.
+
+        CS is held active during the transaction; transactions larger
+        than the spidev buffer are performed in parts,
+        with the same limitations as in write.
+        """
+        view = memoryview(data).cast('B')
+        if out is None:
+            out = bytearray(len(view))
+        result = memoryview(out).cast('B')
+        if len(result) != len(view):
+            raise ValueError('output buffer length must match data length')
+        with self._lock:
+            for start, end, cs_change in self._chunks(len(view)):
+                self.message([SPISegment(view[start:end], result[start:end],
+                                         cs_change=cs_change)])
+        return out
+
+    def start_sampling(self, tx, rate: float=None, capacity: int=4096,
+                       **settings):
+        """
+        Start performing transaction tx (bytes) repeatedly, rate times
+        per second, on a background thread (see spisampler module).
+        Other keyword arguments (speed_hz, bits_per_word) are passed
+        to SPISampler. Returns the started sampler.
+        """
+        from spisampler import SPISampler
+        sampler = SPISampler(self, tx, rate, capacity, **settings)
+        sampler.start()
+        return sampler
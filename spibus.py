@@ -0,0 +1,183 @@
+"""
+This module defines a manager of an SPI bus shared by several devices
+(chip-selects) and clients with different settings:
+
+    bus = SPIBus(0)
+    adc = bus.device(0, mode=0, max_speed_hz=1000000)
+    dac = bus.device(1, mode=1, max_speed_hz=4000000)
+    adc.transfer(b'\x01\x80\x00')
+
+Settings (mode, max_speed_hz, bits_per_word) of each chip-select
+are cached and only changed when it is used by a client with different
+settings. Access from multiple threads is serialized.
+
+Transactions can also be queued and performed by flush(), all queued
+transactions of one chip-select with one SPI_IOC_MESSAGE ioctl
+(speed and word size are set per segment, only a different mode
+splits them).
+"""
+
+from threading import RLock
+try:
+    from typing import List
+except ImportError as err:
+    raise ImportError(
+        'Typing module must be manually installed on Python < 3.5') from err
+
+from spi import SPI, SPISegment, _getBufsiz
+
+
+class SPIDevice(object):
+
+    """Client of one chip-select of SPIBus, with its own settings."""
+
+    def __init__(self, bus: 'SPIBus', cs: int, mode: int,
+                 max_speed_hz: int, bits_per_word: int) -> None:
+        self.bus = bus
+        self.cs = cs
+        self.mode = mode
+        self.max_speed_hz = max_speed_hz
+        self.bits_per_word = bits_per_word
+
+    @property
+    def settings(self) -> tuple:
+        """Settings of the device as (mode, max_speed_hz, bits_per_word)."""
+        return (self.mode, self.max_speed_hz, self.bits_per_word)
+
+    def write(self, data) -> None:
+        """Write data to the device (see SPI.write)."""
+        with self.bus.lock:
+            self.bus._select(self).write(data)
+
+    def read_into(self, buffer) -> None:
+        """Read from the device into buffer (see SPI.read_into)."""
+        with self.bus.lock:
+            self.bus._select(self).read_into(buffer)
+
+    def transfer(self, data, out=None):
+        """Perform transaction with the device (see SPI.transfer)."""
+        with self.bus.lock:
+            return self.bus._select(self).transfer(data, out)
+
+    def message(self, segments: List[SPISegment]) -> None:
+        """Perform multi-segment transaction (see SPI.message)."""
+        with self.bus.lock:
+            self.bus._select(self).message(segments)
+
+    def queue(self, data) -> SPISegment:
+        """
+        Queue transaction sending data, to be performed by the next
+        flush() of the device or bus. Returns its segment, the rx
+        buffer of which holds received data after the flush.
+        """
+        segment = SPISegment.transfer(
+            data, speed_hz=self.max_speed_hz,
+            bits_per_word=self.bits_per_word, cs_change=True)
+        with self.bus.lock:
+            self.bus._queue.setdefault(self.cs, []).append((self, segment))
+        return segment
+
+    def flush(self) -> None:
+        """Perform queued transactions of the chip-select."""
+        self.bus.flush(self.cs)
+
+
+class SPIBus(object):
+
+    """
+    SPI bus shared by devices on several chip-selects
+    (/dev/spidevB.C is opened on first use of chip-select C).
+
+    Other keyword arguments (e.g. spidev) are passed to SPI.
+    """
+
+    def __init__(self, bus: int, **kwargs) -> None:
+        self.bus = bus
+        self._kwargs = kwargs
+        self.lock = RLock()
+        self._spi = {}  # chip-select: SPI
+        self._settings = {}  # chip-select: current settings
+        self._queue = {}  # chip-select: [(device, segment)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def device(self, cs: int, mode: int=0, max_speed_hz: int=500000,
+               bits_per_word: int=8) -> SPIDevice:
+        """Create client of the chip-select with specified settings."""
+        return SPIDevice(self, cs, mode, max_speed_hz, bits_per_word)
+
+    def _select(self, device: SPIDevice) -> SPI:
+        """
+        Return SPI object of the chip-select of the device, configured
+        for the device (call with the lock held).
+        """
+        spi = self._spi.get(device.cs)
+        if spi is None:
+            spi = SPI(self.bus, device.cs, **self._kwargs)
+            self._spi[device.cs] = spi
+        current = self._settings.get(device.cs)
+        settings = device.settings
+        if current != settings:
+            if current is None or current[0] != settings[0]:
+                spi.mode = settings[0]
+            if current is None or current[1] != settings[1]:
+                spi.max_speed_hz = settings[1]
+            if current is None or current[2] != settings[2]:
+                spi.bits_per_word = settings[2]
+            self._settings[device.cs] = settings
+        return spi
+
+    def flush(self, cs: int=None) -> None:
+        """
+        Perform queued transactions of the chip-select (or of all),
+        in order of queuing.
+
+        If a message fails, its error is raised: transactions of that
+        message are dropped (their rx buffers are not valid), later
+        ones stay queued for the next flush().
+        """
+        bufsiz = _getBufsiz()
+        with self.lock:
+            if cs is None:
+                queues, self._queue = self._queue, {}
+            else:
+                queues = {cs: self._queue.pop(cs, [])}
+            try:
+                for key, queue in list(queues.items()):
+                    start = 0
+                    while start < len(queue):
+                        # Consecutive transactions using the same mode,
+                        # fitting into the kernel buffer
+                        device = queue[start][0]
+                        end = start + 1
+                        total = queue[start][1].length
+                        while (end < len(queue) and
+                               queue[end][0].mode == device.mode and
+                               total + queue[end][1].length <= bufsiz):
+                            total += queue[end][1].length
+                            end += 1
+                        segments = [segment
+                                    for _, segment in queue[start:end]]
+                        segments[-1].cs_change = False
+                        queues[key] = queue[end:]
+                        self._select(device).message(segments)
+                        start = end
+            finally:
+                # Requeue transactions not performed (after an error)
+                for key, rest in queues.items():
+                    if rest:
+                        self._queue[key] = rest + self._queue.get(key, [])
+
+    def close(self) -> None:
+        """Close all chip-selects (queued transactions are dropped)."""
+        with self.lock:
+            spis, self._spi = self._spi, {}
+            self._settings = {}
+            self._queue = {}
+        for spi in spis.values():
+            spi.close()
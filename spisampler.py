@@ -0,0 +1,208 @@
+"""
+This module defines continuous sampling of SPI devices (see
+SPI.start_sampling): a background thread performs the same transaction
+at a target rate and stores received data with monotonic timestamps
+into a preallocated ring buffer, which consumers drain in bulk:
+
+    sampler = adc.start_sampling(b'\x01\x80\x00', rate=10000)
+    ...
+    data, times = sampler.drain()
+
+Each sample is a single SPI_IOC_MESSAGE ioctl reading directly into
+the ring buffer, without any allocation in the sampling loop;
+the GIL is released during the ioctl and while waiting.
+Simulated devices (see spisim) are sampled through their message().
+
+With NumPy installed, drain() returns NumPy arrays and the whole ring
+buffer is available as array views (samples, timestamps).
+"""
+
+from array import array
+from ctypes import addressof, c_double, c_uint8
+from fcntl import ioctl
+from threading import Event, Thread
+from time import monotonic, sleep
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from spi import SPI_IOC_MESSAGE, SPIError, SPISegment, spi_ioc_transfer
+
+
+class SPISampler(object):
+
+    """
+    Background sampling of one SPI transaction.
+
+    Sample i of the transaction is stored at slot i % capacity.
+    If consumers do not drain samples in time, the oldest ones
+    are overwritten (counted in dropped). Samples which could not
+    be taken in time are counted in late (the schedule is then
+    restarted rather than catching up in a burst).
+    rate None samples as fast as possible.
+    """
+
+    def __init__(self, spi, tx, rate: float=None, capacity: int=4096, *,
+                 speed_hz: int=0, bits_per_word: int=0) -> None:
+        self.spi = spi
+        self.rate = rate
+        self.capacity = capacity
+        self.size = len(memoryview(tx).cast('B'))
+        self.speed_hz = speed_hz
+        self.bits_per_word = bits_per_word
+        self.dropped = 0
+        self.late = 0
+        self.error = None
+        self._tx = (c_uint8 * self.size).from_buffer_copy(tx)
+        self._ring = (c_uint8 * (capacity * self.size))()
+        self._times = (c_double * capacity)()
+        self._ring_view = memoryview(self._ring).cast('B')
+        self._times_view = memoryview(self._times).cast('B')
+        self._written = 0  # total number of samples taken
+        self._read = 0  # total number of samples drained (or dropped)
+        self._stop = Event()
+        self._thread = None
+        if numpy is not None:
+            self.samples = numpy.frombuffer(
+                self._ring, numpy.uint8).reshape(capacity, self.size)
+            self.timestamps = numpy.frombuffer(self._times, numpy.float64)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return False
+
+    @property
+    def running(self) -> bool:
+        """True while the sampling thread is running."""
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def pending(self) -> int:
+        """Number of samples available to drain."""
+        return min(self._written - self._read, self.capacity - 1)
+
+    def start(self) -> None:
+        """Start the sampling thread."""
+        if self.running:
+            return
+        self._stop.clear()
+        self.error = None
+        self._thread = Thread(target=self._run, daemon=True,
+                              name='spi-sampler')
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the sampling thread (already taken samples are kept)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _transaction(self):
+        """
+        Return function performing transaction into slot index
+        (device classes without file descriptor use their message()).
+        """
+        size = self.size
+        dev = self.spi.dev
+        if hasattr(dev, 'message'):
+            ring = self._ring_view
+            segment = SPISegment(self._tx, None, size,
+                                 speed_hz=self.speed_hz,
+                                 bits_per_word=self.bits_per_word)
+            segments = [segment]
+
+            def perform(index):
+                segment.rx = ring[index * size:(index + 1) * size]
+                dev.message(segments)
+            return perform
+        base = addressof(self._ring)
+        transfer = spi_ioc_transfer(
+            tx_buf=addressof(self._tx), len=size, speed_hz=self.speed_hz,
+            bits_per_word=self.bits_per_word)
+        request = SPI_IOC_MESSAGE(1)
+        fd = self.spi.fileno()
+
+        def perform(index):
+            transfer.rx_buf = base + index * size
+            ioctl(fd, request, transfer)
+        return perform
+
+    def _run(self) -> None:
+        """Sampling loop (runs in the sampling thread)."""
+        capacity = self.capacity
+        times = self._times
+        perform = self._transaction()
+        stopped = self._stop.is_set
+        period = 1 / self.rate if self.rate else 0
+        next_time = monotonic()
+        while not stopped():
+            index = self._written % capacity
+            now = monotonic()
+            try:
+                perform(index)
+            except OSError as err:
+                self.error = SPIError(err.errno, 'SPI sampling failed')
+                return
+            times[index] = now
+            self._written += 1
+            if period:
+                next_time += period
+                delay = next_time - monotonic()
+                if delay > 0:
+                    sleep(delay)
+                elif delay < -period:
+                    self.late += int(-delay / period)
+                    next_time = monotonic()
+
+    def drain(self, max_samples: int=None):
+        """
+        Remove pending samples (up to max_samples) from the buffer,
+        return them as (data, timestamps): bytes with samples one after
+        another and array of monotonic times (seconds) of their start,
+        or NumPy arrays with a row per sample if NumPy is available.
+        """
+        capacity = self.capacity
+        size = self.size
+        pending = self._written - self._read
+        # The slot being written is never read
+        if pending > capacity - 1:
+            self.dropped += pending - (capacity - 1)
+            self._read += pending - (capacity - 1)
+            pending = capacity - 1
+        if max_samples is not None:
+            pending = min(pending, max_samples)
+        start = self._read % capacity
+        end = start + pending
+        ring = self._ring_view
+        stamps = self._times_view
+        if end <= capacity:
+            data = ring[start * size:end * size].tobytes()
+            raw_times = stamps[start * 8:end * 8].tobytes()
+        else:
+            end -= capacity
+            data = (ring[start * size:].tobytes() +
+                    ring[:end * size].tobytes())
+            raw_times = (stamps[start * 8:].tobytes() +
+                         stamps[:end * 8].tobytes())
+        times = array('d')
+        times.frombytes(raw_times)
+        # Oldest samples may have been overwritten during the copy
+        torn = max(0, min(self._written - (capacity - 1) - self._read,
+                          pending))
+        if torn:
+            data = data[torn * size:]
+            del times[:torn]
+            self.dropped += torn
+        self._read += pending
+        pending -= torn
+        if numpy is not None:
+            return (numpy.frombuffer(data, numpy.uint8).reshape(
+                pending, size), numpy.frombuffer(times, numpy.float64))
+        return data, times
@@ -0,0 +1,269 @@
+"""
+This module defines a simulated SpiDev, with loopback and scripted
+device models, for testing and benchmarking without SPI hardware.
+
+Simulated buses are global and identified by number, just like the real
+ones. Attach device models to chip-selects, then select the simulated
+SpiDev:
+
+    sim = spisim.bus(0)
+    adc = sim.attach(0, spisim.ScriptedDevice([b'\x00\x01\xff']))
+    sensor = sim.attach(1, spisim.RegisterDevice(i2csim.BME280Sim()))
+    spi.set_default_spidev(spisim.SimulatedSpiDev)
+    dev = SPI(0, 0)
+    dev.xfer2([1, 0x80, 0])  # [0, 1, 255]
+
+Chip-selects without an attached model behave as loopback
+(MISO connected to MOSI).
+
+Each simulated transaction takes time according to a simple model:
+overhead + bits / speed (bits_per_word per word, at speed_hz of the
+transfer or max_speed_hz of the device) + delay_usecs.
+Latency is disabled by default (realtime=False), the simulated
+duration is only accumulated in busy_time.
+"""
+
+from errno import EBADF, EMSGSIZE
+from threading import Lock
+from time import perf_counter, sleep
+try:
+    from typing import List
+except ImportError as err:
+    raise ImportError(
+        'Typing module must be manually installed on Python < 3.5') from err
+
+
+class LoopbackDevice(object):
+
+    """SPI device returning the data it receives (MISO tied to MOSI)."""
+
+    def transfer(self, data: bytes) -> bytes:
+        """Receive data, return the same number of bytes sent back."""
+        return data
+
+
+class ScriptedDevice(LoopbackDevice):
+
+    """
+    SPI device returning scripted responses, in order.
+
+    Responses are bytes (padded with zeros or truncated to the length
+    of the transfer) or functions of the received data returning bytes.
+    When responses run out, the device answers with zeros (or loops
+    over them again with repeat=True). Received data is kept in
+    received.
+    """
+
+    def __init__(self, responses: list=(), repeat: bool=False) -> None:
+        self.responses = list(responses)
+        self.repeat = repeat
+        self.received = []
+        self._position = 0
+
+    def transfer(self, data: bytes) -> bytes:
+        self.received.append(data)
+        if self._position >= len(self.responses):
+            if not self.repeat or not self.responses:
+                return bytes(len(data))
+            self._position = 0
+        response = self.responses[self._position]
+        self._position += 1
+        if callable(response):
+            response = response(data)
+        response = bytes(response)[:len(data)]
+        return response + bytes(len(data) - len(response))
+
+
+class RegisterDevice(LoopbackDevice):
+
+    """
+    Register-map device model of the i2csim module accessed over SPI,
+    using the convention of Bosch sensors: address byte with bit 7 set
+    starts an auto-incrementing read, otherwise the transfer consists
+    of pairs of address (bit 7 cleared) and value to write.
+    """
+
+    def __init__(self, device) -> None:
+        self.device = device
+
+    def transfer(self, data: bytes) -> bytes:
+        if not data:
+            return b''
+        if data[0] & 0x80:
+            self.device.write(data[:1])
+            return b'\xff' + self.device.read(len(data) - 1)
+        for i in range(0, len(data) - 1, 2):
+            self.device.write(bytes([data[i] | 0x80, data[i + 1]]))
+        return bytes(len(data))
+
+
+class SimulatedSPIBus(object):
+
+    """Simulated SPI bus: attached devices, latency model and counters."""
+
+    def __init__(self, number: int) -> None:
+        self.number = number
+        self.devices = {}
+        self.overhead = 0.0
+        self.realtime = False
+        self.bufsiz = 4096
+        self.lock = Lock()
+        self.reset_stats()
+
+    def attach(self, cs: int, device: LoopbackDevice) -> LoopbackDevice:
+        """Attach device model at specified chip-select."""
+        self.devices[cs] = device
+        return device
+
+    def detach(self, cs: int) -> None:
+        """Remove device from the bus (chip-select becomes loopback)."""
+        del self.devices[cs]
+
+    def reset_stats(self) -> None:
+        """Reset transaction and byte counters and busy time."""
+        self.transactions = 0
+        self.bytes = 0
+        self.busy_time = 0.0
+
+    def transaction(self, cs: int, data: bytes, speed_hz: int,
+                    bits_per_word: int=8, delay_usecs: int=0) -> bytes:
+        """Perform single transfer (CS active) with device."""
+        if len(data) > self.bufsiz:
+            raise OSError(EMSGSIZE, 'Message too long')
+        with self.lock:
+            device = self.devices.get(cs)
+            result = (device.transfer(bytes(data)) if device is not None
+                      else bytes(data))
+            self.transactions += 1
+            self.bytes += len(data)
+            words = len(data) * 8 // max(bits_per_word, 8)
+            delay = (self.overhead + words * bits_per_word / speed_hz +
+                     delay_usecs / 1e6)
+            self.busy_time += delay
+            if self.realtime:
+                end = perf_counter() + delay
+                if delay > 0.002:
+                    sleep(delay - 0.001)
+                while perf_counter() < end:
+                    pass
+            return result
+
+
+# Simulated buses, by number
+_buses = {}
+
+
+def bus(number: int) -> SimulatedSPIBus:
+    """Get (create if needed) simulated bus with specified number."""
+    if number not in _buses:
+        _buses[number] = SimulatedSPIBus(number)
+    return _buses[number]
+
+
+class SimulatedSpiDev(object):
+
+    """
+    SpiDev object connected to a chip-select of a simulated bus.
+
+    Has the same methods and attributes as spidev.SpiDev, so it can be
+    used with SPI(bus, client, spidev=SimulatedSpiDev). It also
+    implements message(), used by SPI for multi-segment transactions.
+    """
+
+    def __init__(self, bus: int=None, client: int=None) -> None:
+        self.sim = None
+        self.cs = None
+        self.mode = 0
+        self.max_speed_hz = 500000
+        self.bits_per_word = 8
+        self.cshigh = False
+        self.loop = False
+        self.lsbfirst = False
+        self.threewire = False
+        self.no_cs = False
+        if bus is not None and client is not None:
+            self.open(bus, client)
+
+    def open(self, number: int, client: int) -> None:
+        self.sim = bus(number)
+        self.cs = client
+
+    def close(self) -> None:
+        self.sim = None
+
+    def fileno(self) -> int:
+        return -1
+
+    def _bus(self) -> SimulatedSPIBus:
+        """Return the simulated bus, raise OSError if closed."""
+        if self.sim is None:
+            raise OSError(EBADF, 'Bad file descriptor')
+        return self.sim
+
+    def _transaction(self, data, speed_hz: int=0, bits_per_word: int=0,
+                     delay_usecs: int=0) -> bytes:
+        return self._bus().transaction(
+            self.cs, data, speed_hz or self.max_speed_hz,
+            bits_per_word or self.bits_per_word, delay_usecs)
+
+    def readbytes(self, length: int) -> List[int]:
+        return list(self._transaction(bytes(length)))
+
+    def writebytes(self, values: List[int]) -> None:
+        self._transaction(bytes(values))
+
+    def writebytes2(self, values) -> None:
+        data = memoryview(values).cast('B')
+        bufsiz = self._bus().bufsiz
+        for start in range(0, len(data), bufsiz):
+            self._transaction(data[start:start + bufsiz])
+
+    def xfer(self, values: List[int], speed_hz: int=0, delay_usecs: int=0,
+             bits_per_word: int=0) -> List[int]:
+        # CS is released between words
+        result = []
+        for value in values:
+            result.extend(self._transaction(
+                bytes([value]), speed_hz, bits_per_word, delay_usecs))
+        return result
+
+    def xfer2(self, values: List[int], speed_hz: int=0, delay_usecs: int=0,
+              bits_per_word: int=0) -> List[int]:
+        return list(self._transaction(
+            bytes(values), speed_hz, bits_per_word, delay_usecs))
+
+    def xfer3(self, values: List[int], speed_hz: int=0, delay_usecs: int=0,
+              bits_per_word: int=0) -> tuple:
+        data = bytes(values)
+        bufsiz = self._bus().bufsiz
+        result = []
+        for start in range(0, len(data), bufsiz):
+            result.extend(self._transaction(
+                data[start:start + bufsiz], speed_hz,
+                bits_per_word, delay_usecs))
+        return tuple(result)
+
+    def message(self, segments) -> None:
+        """Perform multi-segment transaction (see SPI.message)."""
+        if sum(segment.length for segment in segments) > self._bus().bufsiz:
+            raise OSError(EMSGSIZE, 'Message too long')
+        # Segments without cs_change form one transaction (CS active)
+        pending = []
+        for index, segment in enumerate(segments):
+            pending.append(segment)
+            if segment.cs_change or index == len(segments) - 1:
+                data = b''.join(
+                    bytes(memoryview(s.tx).cast('B')[:s.length])
+                    if s.tx is not None else bytes(s.length)
+                    for s in pending)
+                first = pending[0]
+                result = self._transaction(
+                    data, first.speed_hz, first.bits_per_word,
+                    sum(s.delay_usecs for s in pending))
+                offset = 0
+                for s in pending:
+                    if s.rx is not None:
+                        memoryview(s.rx).cast('B')[:s.length] = \
+                            result[offset:offset + s.length]
+                    offset += s.length
+                pending = []
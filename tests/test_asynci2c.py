@@ -0,0 +1,52 @@
+"""
+asyncio front-ends (see asynci2c module) on simulated devices
+(see i2csim and spisim modules).
+
+    python3 -m unittest discover tests
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asynci2c  # noqa: E402
+import i2c  # noqa: E402
+import i2csim  # noqa: E402
+import spisim  # noqa: E402
+from registers import SPIRegisters  # noqa: E402
+from spi import SPI  # noqa: E402
+
+
+class AsyncTest(unittest.TestCase):
+
+    BUS = 12
+
+    def setUp(self):
+        i2csim.bus(self.BUS).attach(0x77, i2csim.BME280Sim())
+        spisim.bus(self.BUS).attach(0, spisim.RegisterDevice(
+            i2csim.BME280Sim()))
+        i2c.set_default_smbus(i2csim.SimulatedSMBus)
+        self.addCleanup(i2c.set_default_smbus, None)
+
+    def test_i2c_and_spi(self):
+        async def measure(sensors):
+            return await asyncio.gather(
+                *[sensor.measure() for sensor in sensors])
+
+        spi = SPI(self.BUS, 0, spidev=spisim.SimulatedSpiDev)
+        self.addCleanup(spi.close)
+        sensors = [asynci2c.AsyncBME280(self.BUS),
+                   asynci2c.AsyncBME280(interface=SPIRegisters(spi))]
+        first, second = asyncio.run(measure(sensors))
+        self.assertEqual(first, second)
+        self.assertEqual(len(asynci2c._workers), 2)
+        for sensor in sensors:
+            sensor.close()
+        self.assertEqual(asynci2c._workers, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
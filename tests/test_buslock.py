@@ -0,0 +1,47 @@
+"""
+Locks serializing access to shared buses (see buslock module).
+
+    python3 -m unittest discover tests
+"""
+
+import os
+import stat
+import sys
+import tempfile
+import unittest
+from errno import ELOOP
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from buslock import FileLock  # noqa: E402
+
+
+class FileLockTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'i2c-1.lock')
+
+    def test_mode(self):
+        umask = os.umask(0o022)
+        try:
+            lock = FileLock(self.path)
+            self.addCleanup(lock.close)
+            with lock:
+                self.assertTrue(lock.locked())
+        finally:
+            os.umask(umask)
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o640)
+
+    def test_symlink(self):
+        target = self.path + '.target'
+        os.symlink(target, self.path)
+        with self.assertRaises(OSError) as context:
+            FileLock(self.path).acquire()
+        self.assertEqual(context.exception.errno, ELOOP)
+        self.assertFalse(os.path.exists(target))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+"""
+I2CBus on simulated devices (see i2csim module).
+
+    python3 -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+from errno import EBUSY, ETIMEDOUT
+from threading import Thread
+from time import sleep
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import i2csim  # noqa: E402
+from i2c import I2CBus, I2CError, I2CMessage  # noqa: E402
+
+
+class LoggingDevice(i2csim.SimulatedDevice):
+
+    """Simulated device recording raw writes."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.log = []
+
+    def write(self, data: bytes) -> None:
+        self.log.append(bytes(data))
+        super().write(data)
+
+
+class SlowSMBus(i2csim.SimulatedSMBus):
+
+    """Simulated SMBus where reads of address 0x51 take delay seconds."""
+
+    delay = 0.0
+
+    def read_byte_data(self, addr: int, cmd: int) -> int:
+        if addr == 0x51:
+            sleep(self.delay)
+        return super().read_byte_data(addr, cmd)
+
+
+class NoRdwrSMBus(i2csim.SimulatedSMBus):
+
+    """Simulated SMBus on an adapter without plain I2C functionality."""
+
+    funcs = 0x00080000  # I2C_FUNC_SMBUS_WRITE_BYTE_DATA
+
+
+class TimeoutTest(unittest.TestCase):
+
+    BUS = 9
+
+    def setUp(self):
+        sim = i2csim.bus(self.BUS)
+        sim.attach(0x50, i2csim.SimulatedDevice())
+        sim.attach(0x51, i2csim.SimulatedDevice())
+        SlowSMBus.delay = 0.5
+        self.bus = I2CBus(self.BUS, smbus=SlowSMBus, timeout=0.1)
+        self.bus.enable_breaker(threshold=1, backoff=0.01)
+        self.addCleanup(self.bus.close)
+
+    def test_hung_transaction(self):
+        errors = []
+
+        def hung():
+            try:
+                self.bus.read_byte_data(0x51, 0)
+            except I2CError as err:
+                errors.append(err)
+
+        thread = Thread(target=hung)
+        thread.start()
+        sleep(0.02)
+        # Waiting for the bus does not count against the timeout,
+        # the bus is busy until the hung transaction finishes
+        with self.assertRaises(I2CError) as context:
+            self.bus.read_byte_data(0x50, 0)
+        self.assertEqual(context.exception.errno, EBUSY)
+        thread.join()
+        self.assertEqual([err.errno for err in errors], [ETIMEDOUT])
+        self.assertEqual(list(self.bus.health), [0x51])
+        sleep(0.5)
+        SlowSMBus.delay = 0.0
+        self.assertEqual(self.bus.read_byte_data(0x50, 0), 0)
+        self.assertEqual(self.bus.read_byte_data(0x51, 0), 0)
+        self.assertEqual(self.bus.health, {})
+
+
+class CacheTest(unittest.TestCase):
+
+    BUS = 10
+
+    def setUp(self):
+        self.device = i2csim.bus(self.BUS).attach(0x50, LoggingDevice())
+        self.bus = I2CBus(self.BUS, smbus=i2csim.SimulatedSMBus)
+        self.addCleanup(self.bus.close)
+        self.bus.cache_registers(0x50, 1, 2, 3)
+
+    def test_suppression(self):
+        self.bus.write_byte_data(0x50, 1, 5)
+        self.bus.write_byte_data(0x50, 1, 5)
+        self.bus.write_byte_data(0x50, 4, 5)
+        self.bus.write_byte_data(0x50, 4, 5)
+        self.assertEqual(self.device.log, [b'\x01\x05', b'\x04\x05',
+                                           b'\x04\x05'])
+        self.bus.invalidate(0x50, 1)
+        self.bus.write_byte_data(0x50, 1, 5)
+        self.assertEqual(len(self.device.log), 4)
+
+    def test_block_write_invalidates(self):
+        self.bus.write_byte_data(0x50, 2, 5)
+        self.bus.write_i2c_block_data(0x50, 1, [6, 7])
+        self.bus.write_byte_data(0x50, 2, 5)
+        self.assertEqual(self.device.regs[2], 5)
+        self.bus.write_byte_data(0x50, 3, 5)
+        self.bus.write_i2c_block_data(0x50, 0, list(range(40)))
+        self.bus.write_byte_data(0x50, 3, 5)
+        self.assertEqual(self.device.regs[3], 5)
+
+    def test_transfer_invalidates(self):
+        self.bus.write_byte_data(0x50, 1, 5)
+        self.bus.transfer([I2CMessage.write(0x50, [1, 6])])
+        self.bus.write_byte_data(0x50, 1, 5)
+        self.assertEqual(self.device.regs[1], 5)
+
+    def test_batch_merge_order(self):
+        with self.bus.batch(auto_increment=True):
+            self.bus.write_byte_data(0x50, 1, 5)
+            self.bus.write_byte_data(0x50, 2, 6)
+            self.bus.write_byte_data(0x50, 1, 7)
+            self.bus.write_byte(0x50, 9)
+            self.bus.write_byte_data(0x50, 4, 8)
+        self.assertEqual(self.device.log, [b'\x01\x07\x06', b'\x09',
+                                           b'\x04\x08'])
+        self.assertEqual(list(self.device.regs[1:5]), [7, 6, 0, 8])
+
+    def test_dropped_batch(self):
+        with self.assertRaises(RuntimeError):
+            with self.bus.batch():
+                self.bus.write_byte_data(0x50, 1, 5)
+                raise RuntimeError
+        self.bus.write_byte_data(0x50, 1, 5)
+        self.assertEqual(self.device.log, [b'\x01\x05'])
+
+
+class LongBlockTest(unittest.TestCase):
+
+    BUS = 11
+
+    def setUp(self):
+        self.sim = i2csim.bus(self.BUS)
+        self.device = self.sim.attach(0x50, LoggingDevice())
+        self.device.regs[:] = bytes(range(256))
+
+    def connect(self, smbus) -> I2CBus:
+        bus = I2CBus(self.BUS, smbus=smbus)
+        self.addCleanup(bus.close)
+        self.sim.reset_stats()
+        return bus
+
+    def test_combined(self):
+        bus = self.connect(i2csim.SimulatedSMBus)
+        self.assertEqual(bus.read_i2c_block_data(0x50, 0xf0, 40),
+                         list(range(0xf0, 0x100)) + list(range(24)))
+        self.assertEqual(self.sim.transactions, 1)
+
+    def test_chunks(self):
+        bus = self.connect(NoRdwrSMBus)
+        self.assertEqual(bus.read_i2c_block_data(0x50, 0xb0, 80),
+                         list(range(0xb0, 0x100)))
+        self.assertEqual(self.sim.transactions, 3)
+        bus.write_i2c_block_data(0x50, 0x10, [1] * 33)
+        self.assertEqual(self.device.log[-2:], [b'\x10' + b'\x01' * 32,
+                                                b'\x30\x01'])
+
+    def test_chunks_past_last_register(self):
+        bus = self.connect(NoRdwrSMBus)
+        with self.assertRaises(ValueError):
+            bus.read_i2c_block_data(0x50, 0xf0, 40)
+        with self.assertRaises(ValueError):
+            bus.write_i2c_block_data(0x50, 0xf0, [0] * 40)
+        self.assertEqual(self.sim.transactions, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
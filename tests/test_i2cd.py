@@ -0,0 +1,81 @@
+"""
+Transactions through the I2C daemon (see i2cd module),
+on simulated devices (see i2csim module).
+
+    python3 -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from threading import Thread
+from time import sleep
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import i2c  # noqa: E402
+import i2cd  # noqa: E402
+import i2csim  # noqa: E402
+from i2c import I2CError, I2CMessage  # noqa: E402
+
+
+class ProxyTest(unittest.TestCase):
+
+    BUS = 8
+
+    def setUp(self):
+        sim = i2csim.bus(self.BUS)
+        sim.attach(0x50, i2csim.SimulatedDevice()).regs[0] = 170
+        sim.attach(0x51, i2csim.SimulatedDevice()).regs[0] = 187
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'i2cd.sock')
+        self.daemon = i2cd.I2CDaemon(self.path, stats=True,
+                                     smbus=i2csim.SimulatedSMBus)
+        Thread(target=self.daemon.serve_forever, daemon=True).start()
+        while not self.daemon._running:
+            sleep(0.01)
+
+    def tearDown(self):
+        self.daemon.shutdown()
+
+    def proxy(self, pipeline: bool=False) -> i2c.I2CBus:
+        bus = i2c.I2CBus(self.BUS, shared=False,
+                         smbus=i2cd.proxy_smbus(self.path, pipeline))
+        self.addCleanup(bus.close)
+        return bus
+
+    def test_transfer_addresses(self):
+        messages = [I2CMessage.write(0x50, [0]), I2CMessage.write(0x51, [0]),
+                    I2CMessage.read(0x51, 1)]
+        self.assertEqual(self.proxy().transfer(messages), [[187]])
+
+    def test_pipelined_error_address(self):
+        bus = self.proxy(pipeline=True)
+        bus.write_byte_data(0x33, 1, 2)
+        with self.assertRaisesRegex(I2CError, '0x33'):
+            bus.read_byte(0x50)
+        self.assertEqual(bus.read_byte_data(0x50, 0), 170)
+
+    def test_pipelined_error_breaker(self):
+        bus = self.proxy(pipeline=True)
+        bus.enable_breaker(threshold=1, backoff=60)
+        bus.write_byte_data(0x33, 1, 2)
+        with self.assertRaises(I2CError):
+            bus.read_byte(0x50)
+        self.assertEqual(list(bus.health), [0x33])
+
+    def test_stats(self):
+        bus = self.proxy()
+        bus.read_byte_data(0x50, 0)
+        with self.assertRaises(I2CError):
+            bus.read_byte_data(0x33, 0)
+        stats = bus.bus.stats()
+        self.assertEqual(stats[0x50]['read_byte_data']['count'], 1)
+        self.assertEqual(stats[0x33]['read_byte_data']['errors'], {5: 1})
+        self.assertEqual(stats, self.daemon.stats()[self.BUS])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+Record and replay round trips of drivers (see i2ctrace module),
+on simulated devices (see i2csim module).
+
+    python3 -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import i2c  # noqa: E402
+import i2csim  # noqa: E402
+import i2ctrace  # noqa: E402
+from bme280 import BME280  # noqa: E402
+from i2c import I2CMessage  # noqa: E402
+from tsl2561 import TSL2561  # noqa: E402
+
+
+class BlockDataSMBus(i2csim.SimulatedSMBus):
+
+    """Simulated SMBus without read_i2c_block_into (like smbus2)."""
+
+    @property
+    def read_i2c_block_into(self):
+        raise AttributeError('read_i2c_block_into')
+
+
+class RoundTripTest(unittest.TestCase):
+
+    BUS = 7
+
+    def setUp(self):
+        sim = i2csim.bus(self.BUS)
+        sim.attach(0x76, i2csim.BME280Sim())
+        sim.attach(0x39, i2csim.TSL2561Sim())
+        handle, self.path = tempfile.mkstemp(suffix='.trace')
+        os.close(handle)
+
+    def tearDown(self):
+        i2c.set_default_smbus(None)
+        os.remove(self.path)
+
+    @staticmethod
+    def workload():
+        sensor = BME280(RoundTripTest.BUS, alternativeAddress=True)
+        light = TSL2561(RoundTripTest.BUS)
+        light.power()
+        return [sensor.measure(), sensor.temperature(), sensor.humidity(),
+                light.id(), light.data()]
+
+    def round_trip(self, smbus):
+        i2c.set_default_smbus(smbus)
+        bus = i2c.I2CBus(self.BUS)
+        bus.start_trace(self.path)
+        try:
+            recorded = self.workload()
+        finally:
+            bus.stop_trace()
+            bus.close()
+        for strict in (True, False):
+            i2c.set_default_smbus(i2ctrace.replay_smbus(self.path, strict))
+            self.assertEqual(self.workload(), recorded)
+
+    def test_block_into_backend(self):
+        self.round_trip(i2csim.SimulatedSMBus)
+
+    def test_block_data_backend(self):
+        self.round_trip(BlockDataSMBus)
+
+    def test_empty_block_result(self):
+        i2c.set_default_smbus(i2csim.SimulatedSMBus)
+        with i2c.I2CBus(self.BUS) as bus:
+            bus.start_trace(self.path)
+            bus.read_i2c_block_data(0x76, 0xd0, 0)
+            bus.stop_trace()
+        i2c.set_default_smbus(i2ctrace.replay_smbus(self.path))
+        with i2c.I2CBus(self.BUS) as bus:
+            self.assertEqual(bus.read_i2c_block_data(0x76, 0xd0, 0), [])
+
+    def test_multi_address_transfer(self):
+        def messages(second):
+            return [I2CMessage.write(0x76, [0xd0]), I2CMessage.read(0x76, 1),
+                    I2CMessage.write(second, [0x0a | 0x80]),
+                    I2CMessage.read(second, 1)]
+
+        i2c.set_default_smbus(i2csim.SimulatedSMBus)
+        with i2c.I2CBus(self.BUS) as bus:
+            bus.start_trace(self.path)
+            recorded = bus.transfer(messages(0x39))
+            bus.stop_trace()
+        self.assertEqual(recorded, [[0x60], [0x50]])
+        for strict in (True, False):
+            i2c.set_default_smbus(i2ctrace.replay_smbus(self.path, strict))
+            with i2c.I2CBus(self.BUS) as bus:
+                self.assertEqual(bus.transfer(messages(0x39)), recorded)
+            with i2c.I2CBus(self.BUS) as bus:
+                with self.assertRaises(i2ctrace.TraceError):
+                    bus.transfer(messages(0x29))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+SPI buffer transfers on simulated devices (see spisim module).
+
+    python3 -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+from threading import Thread
+from time import sleep
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import spi  # noqa: E402
+import spisim  # noqa: E402
+from spi import SPI  # noqa: E402
+
+
+class RecordingSpiDev(spisim.SimulatedSpiDev):
+
+    """Simulated SpiDev recording (tx data, cs_change) of messages."""
+
+    delay = 0.0
+
+    def open(self, number: int, client: int) -> None:
+        super().open(number, client)
+        self.log = []
+
+    def message(self, segments) -> None:
+        for segment in segments:
+            tx = segment.tx if segment.tx is not None else \
+                bytes(segment.length)
+            self.log.append((bytes(tx), segment.cs_change))
+        sleep(self.delay)
+        super().message(segments)
+
+
+class ChunksTest(unittest.TestCase):
+
+    BUS = 13
+    BUFSIZ = 16
+
+    def setUp(self):
+        spisim.bus(self.BUS).bufsiz = self.BUFSIZ
+        bufsiz, spi._bufsiz = spi._bufsiz, self.BUFSIZ
+        self.addCleanup(setattr, spi, '_bufsiz', bufsiz)
+        self.spi = SPI(self.BUS, 0, spidev=RecordingSpiDev)
+        self.addCleanup(self.spi.close)
+
+    def test_boundaries(self):
+        for length, parts in ((1, [1]), (15, [15]), (16, [16]),
+                              (17, [16, 1]), (32, [16, 16]),
+                              (33, [16, 16, 1])):
+            data = bytes(range(length))
+            self.spi.dev.log = []
+            self.assertEqual(self.spi.transfer(data), data)
+            self.assertEqual(b''.join(tx for tx, _ in self.spi.dev.log),
+                             data)
+            self.assertEqual([len(tx) for tx, _ in self.spi.dev.log], parts)
+            self.assertEqual([cs for _, cs in self.spi.dev.log],
+                             [True] * (len(parts) - 1) + [False])
+
+    def test_read_into(self):
+        buffer = bytearray(b'\xff' * 40)
+        self.spi.read_into(buffer)
+        self.assertEqual(buffer, bytes(40))
+        self.assertEqual([len(tx) for tx, _ in self.spi.dev.log],
+                         [16, 16, 8])
+
+    def test_message_too_long(self):
+        segments = [spi.SPISegment.write(bytes(10)),
+                    spi.SPISegment.read(7)]
+        with self.assertRaises(ValueError):
+            self.spi.message(segments)
+        self.assertEqual(self.spi.dev.log, [])
+        self.spi.message(segments[:1] + [spi.SPISegment.read(6)])
+        self.assertEqual(len(self.spi.dev.log), 2)
+
+    def test_parts_not_interleaved(self):
+        RecordingSpiDev.delay = 0.005
+        self.addCleanup(setattr, RecordingSpiDev, 'delay', 0.0)
+
+        def short():
+            for _ in range(5):
+                self.spi.write(b'\x01')
+
+        thread = Thread(target=short)
+        thread.start()
+        self.spi.write(bytes(64))
+        thread.join()
+        log = [tx for tx, _ in self.spi.dev.log]
+        first = log.index(bytes(16))
+        self.assertEqual(log[first:first + 4], [bytes(16)] * 4)
+        self.assertEqual(len(log), 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
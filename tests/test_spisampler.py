@@ -0,0 +1,126 @@
+"""
+Continuous sampling (see spisampler module) of simulated devices
+(see spisim module).
+
+    python3 -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+from threading import Condition
+from time import sleep
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import spisim  # noqa: E402
+from spi import SPI  # noqa: E402
+
+
+class CounterDevice(spisim.LoopbackDevice):
+
+    """
+    SPI device returning the number of its transfer in every byte.
+    Transfers can be paused, to control progress of the sampler.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.allowed = None  # transfers allowed before pausing
+        self.paused = False
+        self.cond = Condition()
+
+    def transfer(self, data: bytes) -> bytes:
+        with self.cond:
+            while self.allowed == 0:
+                self.paused = True
+                self.cond.notify_all()
+                self.cond.wait()
+            self.paused = False
+            if self.allowed is not None:
+                self.allowed -= 1
+            result = bytes([self.count & 0xff]) * len(data)
+            self.count += 1
+        return result
+
+    def allow(self, transfers: int) -> None:
+        """Let transfers pass, wait until the next one is paused."""
+        with self.cond:
+            self.allowed = transfers
+            self.cond.notify_all()
+            self.cond.wait_for(lambda: self.paused and not self.allowed)
+
+    def resume(self) -> None:
+        """Stop pausing transfers."""
+        with self.cond:
+            self.allowed = None
+            self.cond.notify_all()
+
+
+class OvertakingView(object):
+
+    """Ring buffer view letting the sampler take samples on first use."""
+
+    def __init__(self, view, device: CounterDevice, samples: int) -> None:
+        self.view = view
+        self.device = device
+        self.samples = samples
+
+    def __getitem__(self, key):
+        if self.samples:
+            self.device.allow(self.samples)
+            self.samples = 0
+        return self.view[key]
+
+
+class DrainTest(unittest.TestCase):
+
+    BUS = 14
+    CAPACITY = 8
+
+    def setUp(self):
+        self.device = spisim.bus(self.BUS).attach(0, CounterDevice())
+        self.spi = SPI(self.BUS, 0, spidev=spisim.SimulatedSpiDev)
+        self.addCleanup(self.spi.close)
+
+    def check(self, data, times, first: int) -> int:
+        """Check samples are consecutive from first, return next one."""
+        data = bytes(data)
+        self.assertEqual(len(data), 2 * len(times))
+        expected = bytes(b for i in range(first, first + len(times))
+                         for b in 2 * [i & 0xff])
+        self.assertEqual(data, expected)
+        self.assertEqual(list(times), sorted(times))
+        return first + len(times)
+
+    def test_full_ring(self):
+        sampler = self.spi.start_sampling(b'\x00\x00',
+                                          capacity=self.CAPACITY)
+        while self.device.count < 10 * self.CAPACITY:
+            sleep(0.001)
+        sampler.stop()
+        taken = self.device.count
+        data, times = sampler.drain()
+        self.assertEqual(len(times), self.CAPACITY - 1)
+        self.assertEqual(sampler.dropped, taken - (self.CAPACITY - 1))
+        self.check(data, times, sampler.dropped)
+        self.assertEqual(len(sampler.drain()[1]), 0)
+
+    def test_overwritten_during_drain(self):
+        self.device.allowed = 0
+        sampler = self.spi.start_sampling(b'\x00\x00',
+                                          capacity=self.CAPACITY)
+        self.addCleanup(sampler.stop)
+        self.addCleanup(self.device.resume)
+        self.device.allow(20)
+        # Samples 13 to 19 are pending, 20 to 22 overwrite slots
+        # of 12 to 14 during the copy and 23 is being written to 15
+        sampler._ring_view = OvertakingView(sampler._ring_view,
+                                            self.device, 3)
+        data, times = sampler.drain()
+        self.assertEqual(sampler.dropped, 16)
+        self.assertEqual(self.check(data, times, 16), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,5 @@
+from struct import unpack_from
+
 from i2c import I2CBus, I2CError
 
 
@@ -34,6 +36,10 @@ class TSL2561(object):
         else:
             self.addr = self.I2C_ADDRESS
         self._gain16 = False
+        # Buffer for DATA0 and DATA1 registers
+        self._data = bytearray(4)
+        self._data0 = memoryview(self._data)[0:2]
+        self._data1 = memoryview(self._data)[2:4]
 
     def power(self, power=True):
         """Turn chip power on or off."""
@@ -67,10 +73,9 @@ class TSL2561(object):
 
     def data(self):
         """Return measured values (after gain normalization)"""
-        data0 = self._bus.read_i2c_block_data(self.addr, (self.CMD | self.DATA0), 2)
-        data1 = self._bus.read_i2c_block_data(self.addr, (self.CMD | self.DATA1), 2)
-        ch0 = data0[1] * 256 + data0[0]
-        ch1 = data1[1] * 256 + data1[0]
+        self._bus.read_i2c_block_into(self.addr, (self.CMD | self.DATA0), self._data0)
+        self._bus.read_i2c_block_into(self.addr, (self.CMD | self.DATA1), self._data1)
+        ch0, ch1 = unpack_from('<HH', self._data)
         if self._gain16:
             ch0 = ch0 / 16
             ch1 = ch1 / 16